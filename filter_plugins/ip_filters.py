@@ -1,14 +1,66 @@
+import collections
+import functools
+import threading
+
 import netaddr
 
+def _lru_cache(maxsize=1024):
+	''' Memoize a function of hashable arguments; least recently used
+	entries are evicted once maxsize is reached. '''
+	def decorator(fn):
+		cache = collections.OrderedDict()
+		lock = threading.Lock()
+
+		@functools.wraps(fn)
+		def wrapper(*args):
+			with lock:
+				if args in cache:
+					value = cache.pop(args)
+					cache[args] = value
+					return value
+			value = fn(*args)
+			with lock:
+				cache[args] = value
+				if len(cache) > maxsize:
+					cache.popitem(last=False)
+			return value
+		wrapper.cache = cache
+		return wrapper
+	return decorator
+
+def _vectorize(fn):
+	''' Apply the filter to each element when the input is a list. '''
+	@functools.wraps(fn)
+	def wrapper(data, *args):
+		if isinstance(data, (list, tuple)):
+			return [fn(item, *args) for item in data]
+		return fn(data, *args)
+	return wrapper
+
+@_lru_cache()
+def _network(cidr):
+	return netaddr.IPNetwork(cidr)
+
 class FilterModule(object):
 	''' Custom ansible filter '''
 
 	@staticmethod
+	@_vectorize
+	@_lru_cache()
 	def netmask2prefixlen(data):
 		net = netaddr.IPNetwork('0.0.0.0/%s' % data)
 		return net.prefixlen
 
+	@staticmethod
+	@_vectorize
+	@_lru_cache()
+	def subnet_host(cidr, index):
+		''' Address of the nth host of the subnet:
+		"10.64.0.0/16" | subnet_host(1) -> "10.64.0.1" '''
+		return str(_network(cidr)[index])
+
 	def filters(self):
 		return {
-			"netmask2prefixlen": self.netmask2prefixlen
-		}
\ No newline at end of file
+			"netmask2prefixlen": self.netmask2prefixlen,
+			"subnet_host": self.subnet_host,
+		}
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+#
+# Serve the docker image archives (docker save) of a directory over HTTP, so
+# that the hosts of the cluster load the images from the first master instead
+# of pulling them from the remote registry.
+#
+# At most --max-clients transfers run concurrently; additional requests get
+# a 503 response and are retried by the client. The server exits once no
+# transfer has been active for --idle-timeout seconds.
+#
+
+import BaseHTTPServer
+import SocketServer
+import argparse
+import os
+import re
+import shutil
+import threading
+import time
+
+re_archive = re.compile(r'^/([0-9a-f]{12,64})\.tar$')
+
+
+class ImageServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory, max_clients):
+        BaseHTTPServer.HTTPServer.__init__(self, address, ArchiveHandler)
+        self.directory = directory
+        self.slots = threading.BoundedSemaphore(max_clients)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_activity = time.time()
+
+    def transfer_started(self):
+        with self.lock:
+            self.active += 1
+
+    def transfer_done(self):
+        with self.lock:
+            self.active -= 1
+            self.last_activity = time.time()
+
+    def idle_time(self):
+        with self.lock:
+            if self.active:
+                return 0
+            return time.time() - self.last_activity
+
+
+class ArchiveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        m = re_archive.match(self.path)
+        if not m:
+            self.send_error(404)
+            return
+        filename = os.path.join(self.server.directory, m.group(1) + '.tar')
+        if not os.path.exists(filename):
+            self.send_error(404)
+            return
+        if not self.server.slots.acquire(False):
+            self.send_error(503, 'Too many transfers in progress')
+            return
+        self.server.transfer_started()
+        try:
+            with open(filename, 'rb') as fp:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-tar')
+                self.send_header('Content-Length',
+                                 str(os.fstat(fp.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(fp, self.wfile, 1 << 20)
+        finally:
+            self.server.transfer_done()
+            self.server.slots.release()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8190)
+    parser.add_argument('--max-clients', type=int, default=8)
+    parser.add_argument('--idle-timeout', type=int, default=600)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    server = ImageServer(('', args.port), args.directory, args.max_clients)
+    server.timeout = 1
+    while server.idle_time() < args.idle_timeout:
+        server.handle_request()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+#
+# Collect the addressing of the interface used by opencontrail: vhost0 when
+# it is configured, otherwise the physical interface.
+#
+# Returns (as ansible_facts) the opencontrail_host_{address, netmask,
+# prefixlen, ipaddr, gateway, mtu} variables in a single call; used by the
+# plays that do not gather the ansible_<interface> facts.
+#
+
+# import module snippets
+from ansible.module_utils.basic import *
+
+import re
+import socket
+import struct
+
+re_inet = re.compile(r'\binet ([0-9.]+)/([0-9]+)')
+re_default = re.compile(r'default via ([0-9.]+) dev (\S+)')
+
+
+def prefixlen2netmask(prefixlen):
+    mask = (0xffffffff << (32 - prefixlen)) & 0xffffffff
+    return socket.inet_ntoa(struct.pack('!I', mask))
+
+
+def interface_address(module, interface):
+    """ Returns the (address, prefixlen) of the interface or None """
+    rc, out, err = module.run_command(['ip', '-o', '-4', 'addr', 'show',
+                                       'dev', interface])
+    if rc != 0:
+        return None
+    m = re_inet.search(out)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2))
+
+
+def default_gateway(module, interface):
+    """ Default router, when the default route is through the interface """
+    rc, out, err = module.run_command(['ip', '-4', 'route', 'show',
+                                       'default'])
+    if rc != 0:
+        return None
+    for line in out.splitlines():
+        m = re_default.search(line)
+        if m and m.group(2) == interface:
+            return m.group(1)
+    return None
+
+
+def interface_mtu(interface):
+    try:
+        with open('/sys/class/net/%s/mtu' % interface) as fp:
+            return int(fp.read().strip())
+    except (IOError, ValueError):
+        return None
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            interface=dict(required=True),
+            vhost=dict(default='vhost0'),
+        ),
+        supports_check_mode=True
+    )
+
+    interface = None
+    addr = None
+    for name in [module.params['vhost'], module.params['interface']]:
+        addr = interface_address(module, name)
+        if addr is not None:
+            interface = name
+            break
+
+    if addr is None:
+        module.fail_json(msg='No IPv4 address on %s or %s' % (
+            module.params['vhost'], module.params['interface']))
+
+    address, prefixlen = addr
+    facts = {
+        'opencontrail_host_address': address,
+        'opencontrail_host_prefixlen': prefixlen,
+        'opencontrail_host_netmask': prefixlen2netmask(prefixlen),
+        'opencontrail_host_ipaddr': '%s/%d' % (address, prefixlen),
+        'opencontrail_host_gateway': default_gateway(module, interface),
+        'opencontrail_host_mtu': interface_mtu(interface),
+        'opencontrail_host_address_interface': interface,
+    }
+    module.exit_json(changed=False, ansible_facts=facts)
+
+main()
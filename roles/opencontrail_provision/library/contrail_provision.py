@@ -0,0 +1,271 @@
+#!/usr/bin/python
+#
+# Provision the contrail configuration objects required by the cluster:
+# link-local services, control-nodes (bgp-router) and vrouters
+# (virtual-router).
+#
+# The requested objects are compared with the objects present in the
+# contrail-api server; only the missing or modified objects are created or
+# updated. All the requests use a single (keep-alive) HTTP connection.
+#
+
+# import module snippets
+from ansible.module_utils.basic import *
+
+import httplib
+import json
+
+GLOBAL_SYSTEM_CONFIG = ['default-global-system-config']
+GLOBAL_VROUTER_CONFIG = GLOBAL_SYSTEM_CONFIG + ['default-global-vrouter-config']
+IP_FABRIC_RI = ['default-domain', 'default-project', 'ip-fabric', '__default__']
+# Address families configured by provision_control.py on the control-nodes.
+BGP_ADDRESS_FAMILIES = ['route-target', 'inet-vpn', 'e-vpn', 'erm-vpn',
+                        'inet6-vpn']
+
+
+class ApiError(Exception):
+    pass
+
+
+class ApiClient(object):
+    """ contrail-api REST client over a persistent HTTP connection """
+
+    def __init__(self, host, port, timeout=60):
+        self._conn = httplib.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        data = json.dumps(body) if body is not None else None
+        try:
+            self._conn.request(method, path, data, headers)
+            response = self._conn.getresponse()
+            content = response.read()
+        except (httplib.HTTPException, IOError):
+            # The server may have closed the idle connection; retry once.
+            self._conn.close()
+            self._conn.request(method, path, data, headers)
+            response = self._conn.getresponse()
+            content = response.read()
+        if response.status >= 300:
+            raise ApiError('%s %s: %d %s' % (method, path, response.status,
+                                             content))
+        return json.loads(content) if content else None
+
+    def list(self, resource, detail=False):
+        """ Objects of a type, keyed by fq_name (as a tuple) """
+        path = '/%ss' % resource
+        if detail:
+            path += '?detail=True'
+        result = self.request('GET', path)
+        objects = {}
+        for item in result['%ss' % resource]:
+            if detail:
+                item = item[resource]
+            objects[tuple(item['fq_name'])] = item
+        return objects
+
+    def read(self, resource, uuid):
+        return self.request('GET', '/%s/%s' % (resource, uuid))[resource]
+
+    def create(self, resource, obj):
+        return self.request('POST', '/%ss' % resource, {resource: obj})
+
+    def update(self, resource, uuid, obj):
+        return self.request('PUT', '/%s/%s' % (resource, uuid), {resource: obj})
+
+    def close(self):
+        self._conn.close()
+
+
+def linklocal_entry(service):
+    return {
+        'linklocal_service_name': service['name'],
+        'linklocal_service_ip': service['ip'],
+        'linklocal_service_port': int(service['port']),
+        'ip_fabric_service_ip': [service['fabric_ip']],
+        'ip_fabric_service_port': int(service['fabric_port']),
+        'ip_fabric_DNS_service_name': '',
+    }
+
+
+def linklocal_same(current, desired):
+    keys = ['linklocal_service_ip', 'linklocal_service_port',
+            'ip_fabric_service_ip', 'ip_fabric_service_port']
+    return all(current.get(k) == desired[k] for k in keys)
+
+
+def provision_linklocal(client, services, check_mode):
+    """ Merge the services into the global-vrouter-config. Returns the list
+    of the service names that were added or modified.
+    """
+    configs = client.list('global-vrouter-config')
+    config = configs.get(tuple(GLOBAL_VROUTER_CONFIG))
+    current = []
+    if config is not None:
+        config = client.read('global-vrouter-config', config['uuid'])
+        current = config.get('linklocal_services', {}).get(
+            'linklocal_service_entry', [])
+
+    entries = list(current)
+    by_name = dict((e['linklocal_service_name'], i)
+                   for i, e in enumerate(entries))
+    changed = []
+    for service in services:
+        desired = linklocal_entry(service)
+        index = by_name.get(service['name'])
+        if index is None:
+            by_name[service['name']] = len(entries)
+            entries.append(desired)
+        elif not linklocal_same(entries[index], desired):
+            entries[index] = desired
+        else:
+            continue
+        changed.append(service['name'])
+
+    if not changed or check_mode:
+        return changed
+
+    linklocal = {'linklocal_services': {'linklocal_service_entry': entries}}
+    if config is None:
+        linklocal.update({
+            'fq_name': GLOBAL_VROUTER_CONFIG,
+            'parent_type': 'global-system-config',
+        })
+        client.create('global-vrouter-config', linklocal)
+    else:
+        client.update('global-vrouter-config', config['uuid'], linklocal)
+    return changed
+
+
+def bgp_router_parameters(node):
+    return {
+        'vendor': 'contrail',
+        'autonomous_system': int(node.get('asn', 64512)),
+        'identifier': node['address'],
+        'address': node['address'],
+        'port': 179,
+        'address_families': {'family': BGP_ADDRESS_FAMILIES},
+    }
+
+
+def bgp_router_merge(current, params):
+    """ Returns the bgp_router_parameters with the managed fields of params
+    merged into current, or None if current already has them. The address
+    families of current are preserved; the other fields (e.g. hold_time)
+    are left unchanged.
+    """
+    families = current.get('address_families', {}).get('family') or []
+    missing = [f for f in params['address_families']['family']
+               if f not in families]
+    same = not missing and all(current.get(k) == v for k, v in params.items()
+                               if k != 'address_families')
+    if same:
+        return None
+    merged = dict(current)
+    merged.update(params)
+    merged['address_families'] = {'family': list(families) + missing}
+    return merged
+
+
+def provision_control_nodes(client, nodes, check_mode):
+    """ Create or update the bgp-router objects of the control-nodes. New
+    routers peer with all the existing control-nodes.
+    """
+    routers = client.list('bgp-router', detail=True)
+    changed = []
+    for node in nodes:
+        fq_name = IP_FABRIC_RI + [node['name']]
+        params = bgp_router_parameters(node)
+        existing = routers.get(tuple(fq_name))
+        if existing is not None:
+            merged = bgp_router_merge(
+                existing.get('bgp_router_parameters') or {}, params)
+            if merged is None:
+                continue
+            changed.append(node['name'])
+            if not check_mode:
+                client.update('bgp-router', existing['uuid'],
+                              {'bgp_router_parameters': merged})
+            continue
+
+        changed.append(node['name'])
+        if check_mode:
+            continue
+        peering = {'session': [{'attributes': [
+            {'address_families': {'family': BGP_ADDRESS_FAMILIES}}]}]}
+        obj = {
+            'fq_name': fq_name,
+            'parent_type': 'routing-instance',
+            'bgp_router_parameters': params,
+            'bgp_router_refs': [
+                {'to': list(peer), 'attr': peering}
+                for peer, router in routers.items()
+                if router.get('bgp_router_parameters', {}).get('vendor') ==
+                'contrail'
+            ],
+        }
+        result = client.create('bgp-router', obj)
+        routers[tuple(fq_name)] = dict(obj, uuid=result['bgp-router']['uuid'])
+    return changed
+
+
+def provision_vrouters(client, vrouters, check_mode):
+    """ Create or update the virtual-router objects """
+    current = client.list('virtual-router', detail=True)
+    changed = []
+    for vrouter in vrouters:
+        fq_name = GLOBAL_SYSTEM_CONFIG + [vrouter['name']]
+        existing = current.get(tuple(fq_name))
+        if existing is not None:
+            if existing.get('virtual_router_ip_address') == vrouter['address']:
+                continue
+            changed.append(vrouter['name'])
+            if not check_mode:
+                client.update('virtual-router', existing['uuid'], {
+                    'virtual_router_ip_address': vrouter['address']
+                })
+            continue
+        changed.append(vrouter['name'])
+        if not check_mode:
+            client.create('virtual-router', {
+                'fq_name': fq_name,
+                'parent_type': 'global-system-config',
+                'virtual_router_ip_address': vrouter['address'],
+            })
+    return changed
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            api_server=dict(default='localhost'),
+            api_port=dict(type='int', default=8082),
+            linklocal_services=dict(type='list', default=[]),
+            control_nodes=dict(type='list', default=[]),
+            vrouters=dict(type='list', default=[]),
+        ),
+        supports_check_mode=True
+    )
+
+    client = ApiClient(module.params['api_server'], module.params['api_port'])
+    result = {}
+    try:
+        if module.params['linklocal_services']:
+            result['linklocal_services'] = provision_linklocal(
+                client, module.params['linklocal_services'],
+                module.check_mode)
+        if module.params['control_nodes']:
+            result['control_nodes'] = provision_control_nodes(
+                client, module.params['control_nodes'], module.check_mode)
+        if module.params['vrouters']:
+            result['vrouters'] = provision_vrouters(
+                client, module.params['vrouters'], module.check_mode)
+    except (ApiError, httplib.HTTPException, IOError, ValueError), e:
+        module.fail_json(msg=str(e), **result)
+    finally:
+        client.close()
+
+    changed = any(len(v) > 0 for v in result.values())
+    module.exit_json(changed=changed, **result)
+
+main()
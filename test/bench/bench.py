@@ -0,0 +1,459 @@
+#!/usr/bin/python
+
+"""
+Benchmarks for the opencontrail_validate checks and the EC2 modules.
+
+Each benchmark runs in a forked process: setup() builds the fixtures and
+returns the function that is timed. The report contains the wall time, the
+peak resident memory of the process and the number of API calls (ssh
+commands, EC2 requests) issued by the code under test.
+"""
+
+import argparse
+import collections
+import functools
+import imp
+import json
+import os
+import re
+import resource
+import sys
+import time
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+VALIDATE_DIR = os.path.join(BENCH_DIR, '..', 'ec2-origin', 'roles',
+                            'workspace', 'files')
+LIBRARY_DIR = os.path.join(BENCH_DIR, '..', 'common', 'library')
+
+sys.path.insert(0, VALIDATE_DIR)
+
+import cluster_simulator as sim
+import ec2_inventory
+import fake_boto
+import opencontrail_validate as validate
+
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """ Register setup(**params) as the benchmark name. """
+    def decorator(setup):
+        BENCHMARKS.append((name, setup, params))
+        return setup
+    return decorator
+
+
+def load_library(name):
+    return imp.load_source(name, os.path.join(LIBRARY_DIR, name + '.py'))
+
+
+def channel_calls(*channels):
+    calls = collections.Counter()
+    for channel in channels:
+        calls.update(channel.calls)
+    return dict(calls)
+
+
+@benchmark('validate.listen_ports', count=20000)
+def bench_listen_ports(count):
+    channel = sim.ReplayExecutor([
+        (r'^netstat -ntl$',
+         sim.netstat_listen(sim.CONTRAIL_PORTS + range(20000, 20000 + count)))
+    ])
+
+    def run():
+        assert validate.contrail_services_status(channel)
+        return channel_calls(channel)
+    return run
+
+
+@benchmark('validate.docker_ps', count=5000)
+def bench_docker_ps(count):
+    channel = sim.ReplayExecutor([
+        (r'^docker ps', sim.docker_ps(sim.MASTER_CONTAINERS, count))
+    ])
+
+    def run():
+        assert validate.contrail_docker_status(channel)
+        return channel_calls(channel)
+    return run
+
+
+@benchmark('validate.control_instances', count=20000)
+def bench_control_instances(count):
+    channel = sim.ReplayExecutor([
+        (r'Snh_ShowRoutingInstanceSummaryReq', sim.routing_instances(count))
+    ])
+
+    def run():
+        assert validate.contrail_control_instance_status(channel)
+        return channel_calls(channel)
+    return run
+
+
+@benchmark('validate.gateway_routes', count=10000)
+@benchmark('validate.gateway_routes', count=100000)
+def bench_gateway_routes(count):
+    services = ['10.65.0.%d' % (i + 1) for i in range(16)]
+    master = sim.ReplayExecutor([
+        (r'^oc get svc', ' '.join(services) + '\n')
+    ])
+    # The service routes are at the end of the table: worst case.
+    gateway = sim.ReplayExecutor([
+        (r'^vif --list$', sim.vif_list(1000)),
+        (r'Snh_Inet4UcRouteReq', sim.unicast_routes(count, services)),
+    ])
+
+    def run():
+        assert validate.contrail_gateway_expect_svc_routes(
+            gateway, master, '10.0.1.1')
+        return channel_calls(master, gateway)
+    return run
+
+
+@benchmark('validate.system_pods', count=5000)
+def bench_system_pods(count):
+    channel = sim.ReplayExecutor([
+        (r'^oc get pods --watch', sim.pod_lines(sim.default_pods(count)))
+    ])
+
+    def run():
+        assert validate.openshift_system_services(channel, timeout=60)
+        return channel_calls(channel)
+    return run
+
+
+@benchmark('validate.pod_list', count=5000)
+def bench_pod_list(count):
+    channel = sim.ReplayExecutor([
+        (r'^oc get pods -o template', sim.pod_lines(sim.default_pods(count)))
+    ])
+
+    def run():
+        assert len(validate.pod_list(channel)) == count + 2
+        return channel_calls(channel)
+    return run
+
+
+@benchmark('validate.cluster', count=1000, workers=16, latency=0.01)
+def bench_cluster(count, workers, latency):
+    """ Per-host checks and probes of a simulated cluster. """
+    simulator = sim.ClusterSimulator(count, latency=latency)
+    groups = simulator.inventory()
+    executors = []
+
+    def factory(host):
+        executor = simulator.executor(host)
+        executors.append(executor)
+        return executor
+
+    def run():
+        pool = validate.ExecutorPool(factory=factory)
+        with validate.ValidationReport(5) as report:
+            master = pool.get(groups['masters'][0])
+            checks = {
+                'nodes': functools.partial(validate.node_agent_status,
+                                           pool=pool, report=report),
+                'gateways': functools.partial(validate.gateway_agent_status,
+                                              pool=pool, report=report,
+                                              master=master, stage=5),
+            }
+            hosts = [(group, host) for group in ['nodes', 'gateways']
+                     for host in groups[group]]
+            results = validate.check_hosts(hosts, checks, workers)
+            assert all(ok for _, _, ok in results)
+            validate.contrail_svc_reachability_matrix(
+                groups['nodes'], pool, master, workers)
+        return channel_calls(*executors)
+    return run
+
+
+@benchmark('ec2.rtb_update', count=5000, changes=500, workers=1)
+@benchmark('ec2.rtb_update', count=5000, changes=500, workers=8)
+def bench_rtb_update(count, changes, workers):
+    module = load_library('ec2_vpc_rtb_update')
+    counter = fake_boto.CallCounter()
+    tables = {'rtb-1': fake_boto.route_table('rtb-1', count)}
+
+    def connect():
+        return fake_boto.VPCConnection(tables, counter)
+
+    # changes / 2 existing routes point to a new instance and changes / 2
+    # routes are new.
+    routes = [{'dest': '0.0.0.0/0', 'gw': 'igw'}]
+    for i in range(count + changes / 2):
+        gw = fake_boto.instance_id(i)
+        if i < count and i % (2 * count / changes) == 0:
+            gw = fake_boto.instance_id(count + i)
+        routes.append({'dest': fake_boto.route_cidr(i), 'gw': gw})
+
+    def run():
+        connection = connect()
+        assert module.rtb_update(connection, tables['rtb-1'], routes,
+                                 workers=workers, connect=connect)
+        return dict(counter.calls)
+    return run
+
+
+@benchmark('ec2.tables_update', count=200, routes=50, workers=8)
+def bench_tables_update(count, routes, workers):
+    module = load_library('ec2_vpc_rtb_update')
+    counter = fake_boto.CallCounter()
+    # One table per subnet group, except for the last 10% of the groups.
+    existing = count - count / 10
+    tables = dict(('rtb-%d' % i, fake_boto.route_table(
+        'rtb-%d' % i, routes, ['subnet-%d' % i])) for i in range(existing))
+
+    def connect():
+        return fake_boto.VPCConnection(tables, counter)
+
+    # Each group adds one route to its table.
+    groups = [{'subnets': ['subnet-%d' % i], 'state': 'present',
+               'routes': [{'dest': fake_boto.route_cidr(r),
+                           'gw': fake_boto.instance_id(r)}
+                          for r in range(routes + 1)]}
+              for i in range(count)]
+
+    def run():
+        changed, summaries = module.tables_update(
+            connect(), 'vpc-00000001', groups, workers=workers,
+            connect=connect)
+        assert changed and len(summaries) == count
+        return dict(counter.calls)
+    return run
+
+
+@benchmark('ec2.get_instance_info', count=20000)
+@benchmark('ec2.get_instance_info', count=20000,
+           fields=['id', 'private_ip_address', 'tags'])
+def bench_get_instance_info(count, fields=None):
+    module = load_library('ec2_remote_facts')
+    instances = [fake_boto.Instance(i) for i in range(count)]
+
+    def run():
+        for instance in instances:
+            module.get_instance_info(instance, fields)
+        return {}
+    return run
+
+
+@benchmark('ec2.fetch_instances', count=20000, page_size=1000)
+def bench_fetch_instances(count, page_size):
+    module = load_library('ec2_remote_facts')
+    counter = fake_boto.CallCounter()
+    connection = fake_boto.EC2Connection(
+        [fake_boto.Instance(i) for i in range(count)], counter)
+
+    def run():
+        result = module.fetch_ec2_instances(
+            connection, {'instance-state-name': 'running'},
+            ['id', 'public_dns_name'], page_size)
+        assert len(result) == count
+        return dict(counter.calls)
+    return run
+
+
+@benchmark('ec2.inventory', count=20000, cached=False)
+@benchmark('ec2.inventory', count=20000, cached=True)
+def bench_inventory(count, cached):
+    counter = fake_boto.CallCounter()
+    instances = [fake_boto.Instance(i) for i in range(count)]
+    for i, instance in enumerate(instances):
+        instance.tags['Name'] = 'origin-%s-bench' % (
+            'master' if i < 3 else 'gateway' if i < 5 else 'node')
+    connection = fake_boto.EC2Connection(instances, counter)
+    cache = os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                         'bench-inventory-%d.json' % os.getpid())
+    key = 'us-west-2 bench'
+    if cached:
+        ec2_inventory.cache_store(cache, key, ec2_inventory.build_inventory(
+            ec2_inventory.iter_instances(connection, {})))
+        counter.calls.clear()
+
+    def run():
+        try:
+            inventory = ec2_inventory.cache_load(cache, key, 300)
+            if inventory is None:
+                inventory = ec2_inventory.build_inventory(
+                    ec2_inventory.iter_instances(connection, {}))
+                ec2_inventory.cache_store(cache, key, inventory)
+            index = ec2_inventory.host_index(inventory)
+            assert index['origin-node-1']['ansible_ssh_host']
+            assert len(inventory['nodes']['hosts']) == count - 5
+        finally:
+            os.remove(cache)
+        return dict(counter.calls)
+    return run
+
+
+def maxrss_bytes(rusage):
+    # ru_maxrss is in bytes on darwin and in kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss
+    return rusage.ru_maxrss * 1024
+
+
+def scale_params(params, scale):
+    result = dict(params)
+    if 'count' in result:
+        result['count'] = max(1, int(result['count'] * scale))
+    return result
+
+
+def run_forked(setup, params):
+    """ Run the benchmark in a child process; returns the result dict. """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        # The checks print their diagnostics; only the result is reported.
+        sys.stdout = open(os.devnull, 'w')
+        status = 0
+        try:
+            run = setup(**params)
+            setup_rss = maxrss_bytes(
+                resource.getrusage(resource.RUSAGE_SELF))
+            start = time.time()
+            calls = run()
+            result = {
+                'wall': time.time() - start,
+                'setup_rss': setup_rss,
+                'calls': calls,
+            }
+        except BaseException:
+            result = {'error': traceback.format_exc()}
+            status = 1
+        with os.fdopen(wfd, 'w') as fp:
+            json.dump(result, fp)
+        os._exit(status)
+
+    os.close(wfd)
+    with os.fdopen(rfd, 'r') as fp:
+        data = fp.read()
+    _, status, rusage = os.wait4(pid, 0)
+    try:
+        result = json.loads(data)
+    except ValueError:
+        result = {'error': 'benchmark process exited with status %d' % status}
+    result['peak_rss'] = maxrss_bytes(rusage)
+    return result
+
+
+def benchmark_id(name, params):
+    args = ','.join('%s=%s' % (k, v if not isinstance(v, list)
+                               else '+'.join(v))
+                    for k, v in sorted(params.items()))
+    return '%s[%s]' % (name, args)
+
+
+def run_benchmarks(pattern, scale, repeat):
+    """ Returns a list of results; the wall time is the best of repeat runs,
+    the memory the highest.
+    """
+    regexp = re.compile(pattern or '')
+    results = []
+    for name, setup, params in sorted(BENCHMARKS, key=lambda b: b[0]):
+        params = scale_params(params, scale)
+        bench_id = benchmark_id(name, params)
+        if not regexp.search(bench_id):
+            continue
+        runs = [run_forked(setup, params) for _ in range(repeat)]
+        errors = [r['error'] for r in runs if 'error' in r]
+        if errors:
+            results.append({'id': bench_id, 'error': errors[0]})
+            continue
+        results.append({
+            'id': bench_id,
+            'wall': min(r['wall'] for r in runs),
+            'peak_rss': max(r['peak_rss'] for r in runs),
+            'setup_rss': max(r['setup_rss'] for r in runs),
+            'calls': runs[0]['calls'],
+        })
+    return results
+
+
+def compare(result, baseline, threshold):
+    """ Returns the list of regressions of result relative to baseline. """
+    regressions = []
+    if baseline is None or 'error' in result or 'error' in baseline:
+        return regressions
+    if result['wall'] > baseline['wall'] * (1 + threshold):
+        regressions.append('wall %.3fs -> %.3fs' % (baseline['wall'],
+                                                   result['wall']))
+    if result['peak_rss'] > baseline['peak_rss'] * (1 + threshold):
+        regressions.append('peak_rss %.1fMB -> %.1fMB' % (
+            baseline['peak_rss'] / 1048576.0, result['peak_rss'] / 1048576.0))
+    for name, count in sorted(result['calls'].items()):
+        if count > baseline['calls'].get(name, 0):
+            regressions.append('%s %d -> %d' % (
+                name, baseline['calls'].get(name, 0), count))
+    return regressions
+
+
+def format_calls(calls):
+    return ' '.join('%s=%d' % item for item in sorted(calls.items())) or '-'
+
+
+def print_results(results, regressions):
+    width = max([len(r['id']) for r in results] + [9])
+    print '%-*s %10s %10s %10s  %s' % (width, 'benchmark', 'wall (s)',
+                                    'peak (MB)', 'setup (MB)', 'api calls')
+    for result in results:
+        if 'error' in result:
+            print '%-*s ERROR' % (width, result['id'])
+            print result['error']
+            continue
+        print '%-*s %10.3f %10.1f %10.1f  %s' % (
+            width, result['id'], result['wall'],
+            result['peak_rss'] / 1048576.0, result['setup_rss'] / 1048576.0,
+            format_calls(result['calls']))
+        for regression in regressions.get(result['id'], []):
+            print '%-*s REGRESSION %s' % (width, '', regression)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--filter', help='regexp on the benchmark id')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplier applied to the fixture sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--list', action='store_true',
+                        help='list the benchmarks and exit')
+    parser.add_argument('--output', help='write the results (JSON)')
+    parser.add_argument('--baseline',
+                        help='results of a previous run (--output) to '
+                        'compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='tolerated wall time / memory increase')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, _, params in sorted(BENCHMARKS, key=lambda b: b[0]):
+            print benchmark_id(name, scale_params(params, args.scale))
+        return
+
+    results = run_benchmarks(args.filter, args.scale, args.repeat)
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = dict((r['id'], r) for r in json.load(fp))
+        for result in results:
+            found = compare(result, baseline.get(result['id']),
+                            args.threshold)
+            if found:
+                regressions[result['id']] = found
+
+    print_results(results, regressions)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if regressions or any('error' in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
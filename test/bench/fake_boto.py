@@ -0,0 +1,205 @@
+"""
+In-memory stand-ins for the boto objects used by the EC2 modules.
+
+The fake connections count the API calls so that the benchmarks can report
+the number of requests a module would send to EC2.
+"""
+
+import collections
+import threading
+
+
+class CallCounter(object):
+    """ Thread safe count of API calls by name """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+
+class Route(object):
+    def __init__(self, destination_cidr_block, instance_id=None,
+                 gateway_id=None):
+        self.destination_cidr_block = destination_cidr_block
+        self.instance_id = instance_id
+        self.gateway_id = gateway_id
+
+
+class Association(object):
+    def __init__(self, subnet_id):
+        self.subnet_id = subnet_id
+
+
+class RouteTable(object):
+    def __init__(self, id, routes, subnets=()):
+        self.id = id
+        self.routes = routes
+        self.associations = [Association(s) for s in subnets]
+
+
+_create_lock = threading.Lock()
+
+
+class VPCConnection(object):
+    """ Route table API; the tables are shared by all the connections
+    created from the same counter (see connect()).
+    """
+
+    def __init__(self, tables, counter):
+        self._tables = tables
+        self._counter = counter
+
+    def get_all_route_tables(self, filters=None):
+        self._counter.count('DescribeRouteTables')
+        return self._tables.values()
+
+    def create_route(self, rtb_id, dest, instance_id=None):
+        self._counter.count('CreateRoute')
+        self._tables[rtb_id].routes.append(Route(dest, instance_id))
+        return True
+
+    def replace_route(self, rtb_id, dest, instance_id=None):
+        self._counter.count('ReplaceRoute')
+        for route in self._tables[rtb_id].routes:
+            if route.destination_cidr_block == dest:
+                route.instance_id = instance_id
+        return True
+
+    def delete_route(self, rtb_id, dest):
+        self._counter.count('DeleteRoute')
+        rtb = self._tables[rtb_id]
+        rtb.routes = [r for r in rtb.routes
+                      if r.destination_cidr_block != dest]
+        return True
+
+    def create_route_table(self, vpc_id):
+        self._counter.count('CreateRouteTable')
+        with _create_lock:
+            rtb = RouteTable('rtb-%08x' % len(self._tables), [])
+            self._tables[rtb.id] = rtb
+        return rtb
+
+    def associate_route_table(self, rtb_id, subnet_id):
+        self._counter.count('AssociateRouteTable')
+        self._tables[rtb_id].associations.append(Association(subnet_id))
+        return 'rtbassoc-%s' % subnet_id
+
+
+def route_table(id, count, subnets=()):
+    """ Table with an internet gateway default route and count instance
+    routes.
+    """
+    routes = [Route('0.0.0.0/0', gateway_id='igw-00000001')]
+    routes.extend(Route(route_cidr(i), instance_id=instance_id(i))
+                  for i in range(count))
+    return RouteTable(id, routes, subnets)
+
+
+def route_cidr(index):
+    return '10.%d.%d.0/24' % (32 + index / 256, index % 256)
+
+
+def instance_id(index):
+    return 'i-%08x' % index
+
+
+class Group(object):
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class Interface(object):
+    def __init__(self, id, mac_address):
+        self.id = id
+        self.mac_address = mac_address
+
+
+class Placement(object):
+    def __init__(self, zone):
+        self.tenancy = 'default'
+        self.zone = zone
+
+
+class State(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Region(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Instance(object):
+    def __init__(self, index, region='us-west-2'):
+        self.id = instance_id(index)
+        self.kernel = None
+        self.instance_profile = None
+        self.root_device_type = 'ebs'
+        self.private_dns_name = 'ip-10-0-%d-%d.ec2.internal' % (
+            index / 250, 1 + index % 250)
+        self.public_dns_name = 'ec2-54-0-%d-%d.compute.amazonaws.com' % (
+            index / 250, 1 + index % 250)
+        self.ebs_optimized = False
+        self.client_token = ''
+        self.virtualization_type = 'hvm'
+        self.architecture = 'x86_64'
+        self.ramdisk = None
+        self.tags = {'Name': 'node-%d' % index, 'job-id': 'bench'}
+        self.key_name = 'bench'
+        self.sourceDestCheck = 'false'
+        self.image_id = 'ami-00000001'
+        self.groups = [Group('sg-00000001', 'default')]
+        self.interfaces = [Interface('eni-%08x' % index,
+                                     '02:00:00:%02x:%02x:%02x' % (
+                                         index >> 16 & 0xff,
+                                         index >> 8 & 0xff, index & 0xff))]
+        self.spot_instance_request_id = None
+        self.requester_id = None
+        self.monitoring_state = 'disabled'
+        self._placement = Placement(region + 'a')
+        self.ami_launch_index = 0
+        self.launch_time = '2016-01-01T00:00:00.000Z'
+        self.hypervisor = 'xen'
+        self.region = Region(region)
+        self.persistent = False
+        self.private_ip_address = '10.0.%d.%d' % (index / 250,
+                                                  1 + index % 250)
+        self._state = State('running')
+        self.vpc_id = 'vpc-00000001'
+
+
+class Reservation(object):
+    def __init__(self, instances):
+        self.instances = instances
+
+
+class ResultSet(list):
+    next_token = None
+
+
+class EC2Connection(object):
+    """ DescribeInstances with max_results / next_token pagination """
+
+    def __init__(self, instances, counter, per_reservation=1):
+        self._reservations = [
+            Reservation(instances[i:i + per_reservation])
+            for i in range(0, len(instances), per_reservation)]
+        self._counter = counter
+
+    def get_all_reservations(self, filters=None, max_results=None,
+                             next_token=None):
+        self._counter.count('DescribeInstances')
+        start = int(next_token or 0)
+        end = len(self._reservations)
+        if max_results:
+            end = min(end, start + max_results)
+        result = ResultSet(self._reservations[start:end])
+        if end < len(self._reservations):
+            result.next_token = str(end)
+        return result
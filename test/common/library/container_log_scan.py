@@ -0,0 +1,241 @@
+#!/usr/bin/python
+#
+# Scan the logs of the running containers for known failure signatures.
+#
+# Each run only reads the log bytes written since the previous run: the
+# offset reached in the json-file log of each container is kept in a cursor
+# file (cursor_path). On the first scan of a container only the lines logged
+# in the last 'since' seconds are reported, out of at most the last
+# initial_bytes of its log. Containers that use another log driver are read
+# with 'docker logs --since' the time of the previous scan.
+#
+# The signatures are compiled into a single regular expression so that the
+# log lines are matched in one pass. For json-file logs the expression is
+# matched against the raw (JSON encoded) line and only the lines that match
+# are decoded; patterns should not depend on characters that JSON escapes.
+#
+# Returns the list of hits (container, name, signature, time, message), the
+# number of hits per signature and the ids of the containers where each
+# signature matched.
+#
+
+# import module snippets
+from ansible.module_utils.basic import *
+
+import json
+import os
+import re
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_SIGNATURES = [
+    {'name': 'NoFqnSet', 'pattern': r'NoFqnSet'},
+]
+
+
+class SignatureSet(object):
+    """ Failure signatures matched in a single pass """
+
+    def __init__(self, signatures):
+        self.names = [s['name'] for s in signatures]
+        self._regexps = [re.compile(s['pattern']) for s in signatures]
+        self._combined = re.compile('|'.join(
+            '(?:%s)' % s['pattern'] for s in signatures))
+
+    def candidate(self, line):
+        return self._combined.search(line) is not None
+
+    def matches(self, text):
+        """ Names of the signatures that match text """
+        return [name for name, regexp in zip(self.names, self._regexps)
+                if regexp.search(text)]
+
+
+def load_cursors(path):
+    try:
+        with open(path, 'r') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return {}
+
+
+def store_cursors(path, cursors):
+    dirname = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmpname = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(cursors, fp)
+    os.rename(tmpname, path)
+
+
+def list_containers(module, name_regexp):
+    """ (id, name, log_path) of the running containers whose name matches """
+    rc, out, err = module.run_command(
+        ['docker', 'ps', '--no-trunc', '--format', '{{.ID}} {{.Names}}'])
+    if rc != 0:
+        module.fail_json(msg='docker ps failed: %s' % err)
+    names = {}
+    for line in out.splitlines():
+        fields = line.split(None, 1)
+        if len(fields) == 2 and name_regexp.search(fields[1]):
+            names[fields[0]] = fields[1]
+    if not names:
+        return []
+
+    rc, out, err = module.run_command(
+        ['docker', 'inspect', '--format', '{{.Id}} {{.LogPath}}'] +
+        sorted(names))
+    log_paths = {}
+    for line in out.splitlines():
+        fields = line.split(None, 1)
+        if fields:
+            log_paths[fields[0]] = fields[1] if len(fields) > 1 else ''
+    return [(cid, names[cid], log_paths.get(cid, ''))
+            for cid in sorted(names)]
+
+
+def scan_log_file(path, cursor, signatures, initial_bytes, since):
+    """ Scan the lines appended to a json-file log since cursor; without a
+    cursor, the lines logged before the 'since' timestamp are skipped.
+
+    Returns (hits, cursor, bytes_read); hits is a list of
+    (signature, time, message).
+    """
+    # json-file timestamps are RFC 3339 in UTC: compare them as strings.
+    cutoff = None
+    if cursor is None:
+        cutoff = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(since))
+    st = os.stat(path)
+    if cursor is None:
+        offset = max(0, st.st_size - initial_bytes)
+    elif cursor.get('inode') != st.st_ino or \
+            cursor.get('offset', 0) > st.st_size:
+        # The log was rotated or truncated.
+        offset = 0
+    else:
+        offset = cursor.get('offset', 0)
+
+    hits = []
+    with open(path, 'rb') as fp:
+        fp.seek(offset)
+        if cursor is None and offset > 0:
+            # Start at the beginning of a line.
+            offset += len(fp.readline())
+        start = offset
+        for line in fp:
+            if not line.endswith('\n'):
+                # Incomplete line: read again on the next run.
+                break
+            offset += len(line)
+            if not signatures.candidate(line):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if cutoff is not None and entry.get('time', '') < cutoff:
+                continue
+            message = entry.get('log', '').rstrip('\n')
+            for name in signatures.matches(message):
+                hits.append((name, entry.get('time'), message))
+    return hits, {'inode': st.st_ino, 'offset': offset}, offset - start
+
+
+def scan_docker_logs(module, container, cursor, signatures, since):
+    """ Scan 'docker logs' since the time of the previous scan """
+    now = int(time.time())
+    cmd = ['docker', 'logs', '--timestamps']
+    if cursor and 'since' in cursor:
+        cmd.extend(['--since', str(cursor['since'])])
+    else:
+        cmd.extend(['--since', str(int(since))])
+    rc, out, err = module.run_command(cmd + [container])
+    hits = []
+    for line in (out + err).splitlines():
+        if not signatures.candidate(line):
+            continue
+        timestamp, _, message = line.partition(' ')
+        for name in signatures.matches(message):
+            hits.append((name, timestamp, message))
+    return hits, {'since': now}, len(out) + len(err)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            containers=dict(default='contrail|ifmap'),
+            signatures=dict(type='list', default=DEFAULT_SIGNATURES),
+            cursor_path=dict(default='/var/lib/container_log_scan/cursors'),
+            initial_bytes=dict(type='int', default=1 << 20),
+            since=dict(type='int', default=60),
+            max_hits=dict(type='int', default=20),
+            workers=dict(type='int', default=8),
+        )
+    )
+
+    try:
+        signatures = SignatureSet(module.params.get('signatures'))
+    except (KeyError, TypeError, re.error), e:
+        module.fail_json(msg='invalid signatures: %s' % e)
+
+    cursor_path = module.params.get('cursor_path')
+    since = time.time() - module.params.get('since')
+    cursors = load_cursors(cursor_path)
+    containers = list_containers(module,
+                                 re.compile(module.params.get('containers')))
+
+    def scan(container):
+        cid, name, log_path = container
+        try:
+            if log_path and os.path.exists(log_path):
+                return container, scan_log_file(
+                    log_path, cursors.get(cid), signatures,
+                    module.params.get('initial_bytes'), since)
+            return container, scan_docker_logs(module, cid, cursors.get(cid),
+                                               signatures, since)
+        except (IOError, OSError):
+            return container, ([], cursors.get(cid), 0)
+
+    workers = min(module.params.get('workers'), len(containers))
+    if workers <= 1:
+        results = map(scan, containers)
+    else:
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(scan, containers)
+        finally:
+            pool.close()
+            pool.join()
+
+    hits = []
+    counts = dict((name, 0) for name in signatures.names)
+    matched = dict((name, []) for name in signatures.names)
+    new_cursors = {}
+    bytes_read = 0
+    for (cid, name, _), (container_hits, cursor, size) in results:
+        if cursor is not None:
+            new_cursors[cid] = cursor
+        bytes_read += size
+        for signature, timestamp, message in container_hits:
+            counts[signature] += 1
+            if cid not in matched[signature]:
+                matched[signature].append(cid)
+            if counts[signature] <= module.params.get('max_hits'):
+                hits.append(dict(container=cid, name=name,
+                                 signature=signature, time=timestamp,
+                                 message=message))
+
+    # Cursors of the containers that are no longer running are dropped.
+    try:
+        store_cursors(cursor_path, new_cursors)
+    except (IOError, OSError), e:
+        module.fail_json(msg='unable to store the cursors: %s' % e)
+
+    module.exit_json(changed=False, hits=hits, counts=counts,
+                     matched=matched, containers=len(containers),
+                     bytes_read=bytes_read)
+
+if __name__ == '__main__':
+    main()
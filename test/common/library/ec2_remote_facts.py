@@ -26,6 +26,21 @@ options:
       - A dict of filters to apply. Each dict item consists of a filter key and a filter value. See U(http://docs.aws.amazon.com/AWSEC2/latest/APIReference/API_DescribeInstances.html) for possible filters.
     required: false
     default: null
+  fields:
+    description:
+      - List of instance attributes to return (e.g. id, private_ip_address, tags). All the attributes are returned by default.
+    required: false
+    default: null
+  regions:
+    description:
+      - List of regions to query concurrently. Defaults to the module region.
+    required: false
+    default: null
+  page_size:
+    description:
+      - Number of instances retrieved per DescribeInstances call.
+    required: false
+    default: 1000
 author:
     - "Michael Schuett (@michaeljs1990)"
 extends_documentation_fragment:
@@ -50,6 +65,18 @@ EXAMPLES = '''
     filters:
       instance-id: i-123456
 
+# Gather the addresses of the running instances in two regions
+- ec2_remote_facts:
+    regions:
+      - us-west-1
+      - us-west-2
+    fields:
+      - id
+      - private_ip_address
+      - tags
+    filters:
+      instance-state-name: running
+
 # Gather facts about all instances in vpc-123456 that are t2.small type
 - ec2_remote_facts:
     filters:
@@ -65,82 +92,146 @@ try:
 except ImportError:
     HAS_BOTO = False
 
-def get_instance_info(instance):
+from multiprocessing.pool import ThreadPool
 
-    # Get groups
+def get_groups(instance):
     groups = []
     for group in instance.groups:
         groups.append({ 'id': group.id, 'name': group.name }.copy())
+    return groups
 
-    # Get interfaces
+
+def get_interfaces(instance):
     interfaces = []
     for interface in instance.interfaces:
         interfaces.append({ 'id': interface.id, 'mac_address': interface.mac_address }.copy())
+    return interfaces
+
 
+def get_source_dest_check(instance):
     # If an instance is terminated, sourceDestCheck is no longer returned
     try:
-        source_dest_check = instance.sourceDestCheck
+        return instance.sourceDestCheck
     except AttributeError:
-        source_dest_check = None
-
-    instance_info = { 'id': instance.id,
-                    'kernel': instance.kernel,
-                    'instance_profile': instance.instance_profile,
-                    'root_device_type': instance.root_device_type,
-                    'private_dns_name': instance.private_dns_name,
-                    'public_dns_name': instance.public_dns_name,
-                    'ebs_optimized': instance.ebs_optimized,
-                    'client_token': instance.client_token,
-                    'virtualization_type': instance.virtualization_type,
-                    'architecture': instance.architecture,
-                    'ramdisk': instance.ramdisk,
-                    'tags': instance.tags,
-                    'key_name': instance.key_name,
-                    'source_destination_check': source_dest_check,
-                    'image_id': instance.image_id,
-                    'groups': groups,
-                    'interfaces': interfaces,
-                    'spot_instance_request_id': instance.spot_instance_request_id,
-                    'requester_id': instance.requester_id,
-                    'monitoring_state': instance.monitoring_state,
-                    'placement': {
-                                  'tenancy': instance._placement.tenancy,
-                                  'zone': instance._placement.zone
-                                 },
-                    'ami_launch_index': instance.ami_launch_index,
-                    'launch_time': instance.launch_time,
-                    'hypervisor': instance.hypervisor,
-                    'region': instance.region.name,
-                    'persistent': instance.persistent,
-                    'private_ip_address': instance.private_ip_address,
-                    'state': instance._state.name,
-                    'vpc_id': instance.vpc_id,
-                  }
+        return None
+
+
+# Instance attributes by name; only the requested ones are computed.
+INSTANCE_FIELDS = {
+    'id': lambda i: i.id,
+    'kernel': lambda i: i.kernel,
+    'instance_profile': lambda i: i.instance_profile,
+    'root_device_type': lambda i: i.root_device_type,
+    'private_dns_name': lambda i: i.private_dns_name,
+    'public_dns_name': lambda i: i.public_dns_name,
+    'ebs_optimized': lambda i: i.ebs_optimized,
+    'client_token': lambda i: i.client_token,
+    'virtualization_type': lambda i: i.virtualization_type,
+    'architecture': lambda i: i.architecture,
+    'ramdisk': lambda i: i.ramdisk,
+    'tags': lambda i: i.tags,
+    'key_name': lambda i: i.key_name,
+    'source_destination_check': get_source_dest_check,
+    'image_id': lambda i: i.image_id,
+    'groups': get_groups,
+    'interfaces': get_interfaces,
+    'spot_instance_request_id': lambda i: i.spot_instance_request_id,
+    'requester_id': lambda i: i.requester_id,
+    'monitoring_state': lambda i: i.monitoring_state,
+    'placement': lambda i: {
+                            'tenancy': i._placement.tenancy,
+                            'zone': i._placement.zone
+                           },
+    'ami_launch_index': lambda i: i.ami_launch_index,
+    'launch_time': lambda i: i.launch_time,
+    'hypervisor': lambda i: i.hypervisor,
+    'region': lambda i: i.region.name,
+    'persistent': lambda i: i.persistent,
+    'private_ip_address': lambda i: i.private_ip_address,
+    'state': lambda i: i._state.name,
+    'vpc_id': lambda i: i.vpc_id,
+}
+
+
+def get_instance_info(instance, fields=None):
+
+    if fields is None:
+        fields = INSTANCE_FIELDS.keys()
+
+    instance_info = {}
+    for field in fields:
+        instance_info[field] = INSTANCE_FIELDS[field](instance)
 
     return instance_info
 
 
-def list_ec2_instances(connection, module):
+def iter_ec2_instances(connection, filters, page_size):
+    """ Generator over the instances, one DescribeInstances page at a time """
+    next_token = None
+    while True:
+        reservations = connection.get_all_reservations(
+            filters=filters, max_results=page_size, next_token=next_token)
+        for reservation in reservations:
+            for instance in reservation.instances:
+                yield instance
+        next_token = reservations.next_token
+        if not next_token:
+            break
+
+
+def fetch_ec2_instances(connection, filters, fields, page_size):
+    return [get_instance_info(instance, fields)
+            for instance in iter_ec2_instances(connection, filters, page_size)]
 
-    filters = module.params.get("filters")
-    instance_dict_array = []
+
+def list_ec2_instances(connection, module):
 
     try:
-        all_instances = connection.get_only_instances(filters=filters)
+        return fetch_ec2_instances(connection, module.params.get("filters"),
+                                   module.params.get("fields"),
+                                   module.params.get("page_size"))
     except BotoServerError as e:
         module.fail_json(msg=e.message)
 
-    for instance in all_instances:
-        instance_dict_array.append(get_instance_info(instance))
 
-    module.exit_json(instances=instance_dict_array)
+def list_regions_instances(module, regions, aws_connect_params):
+    """ Query each region concurrently; returns the concatenated results """
+
+    # module.fail_json exits: errors are reported from the main thread.
+    def list_region(region):
+        try:
+            connection = connect_to_aws(boto.ec2, region, **aws_connect_params)
+            return fetch_ec2_instances(connection,
+                                       module.params.get("filters"),
+                                       module.params.get("fields"),
+                                       module.params.get("page_size")), None
+        except BotoServerError as e:
+            return None, '%s: %s' % (region, e.message)
+        except (boto.exception.NoAuthHandlerFound, AnsibleAWSError), e:
+            return None, '%s: %s' % (region, e)
+
+    pool = ThreadPool(len(regions))
+    try:
+        results = pool.map(list_region, regions)
+    finally:
+        pool.close()
+        pool.join()
+
+    errors = [error for _, error in results if error]
+    if errors:
+        module.fail_json(msg='; '.join(errors))
+
+    return [instance for instances, _ in results for instance in instances]
 
 
 def main():
     argument_spec = ec2_argument_spec()
     argument_spec.update(
         dict(
-            filters = dict(default=None, type='dict')
+            filters = dict(default=None, type='dict'),
+            fields = dict(default=None, type='list'),
+            regions = dict(default=None, type='list'),
+            page_size = dict(default=1000, type='int')
         )
     )
 
@@ -149,8 +240,19 @@ def main():
     if not HAS_BOTO:
         module.fail_json(msg='boto required for this module')
 
+    fields = module.params.get('fields')
+    if fields:
+        unknown = [f for f in fields if f not in INSTANCE_FIELDS]
+        if unknown:
+            module.fail_json(msg='unknown fields: %s' % ', '.join(unknown))
+
     region, ec2_url, aws_connect_params = get_aws_connection_info(module)
 
+    regions = module.params.get('regions')
+    if regions:
+        module.exit_json(instances=list_regions_instances(
+            module, regions, aws_connect_params))
+
     if region:
         try:
             connection = connect_to_aws(boto.ec2, region, **aws_connect_params)
@@ -159,7 +261,7 @@ def main():
     else:
         module.fail_json(msg="region must be specified")
 
-    list_ec2_instances(connection, module)
+    module.exit_json(instances=list_ec2_instances(connection, module))
 
 # import module snippets
 from ansible.module_utils.basic import *
@@ -2,6 +2,10 @@
 #
 # Retrieve information on an existing VPC.
 #
+# The resource_tags are passed to the API as tag filters. The facts can be
+# cached on disk (cache_path) for cache_ttl seconds; changing cache_key
+# invalidates the cached entry.
+#
 
 # import module snippets
 from ansible.module_utils.basic import *
@@ -9,35 +13,58 @@ from ansible.module_utils.ec2 import *
 
 import boto.vpc
 
+import hashlib
+import json
+import os
+import tempfile
+import time
 
-def main():
-    argument_spec = ec2_argument_spec()
-    argument_spec.update(dict(
-        resource_tags=dict(type='dict', required=True)
-    ))
-    module = AnsibleModule(argument_spec=argument_spec)
 
-    ec2_url, aws_access_key, aws_secret_key, region = get_ec2_creds(module)
+def cache_entry_key(region, resource_tags, cache_key):
+    data = json.dumps([region, resource_tags, cache_key], sort_keys=True)
+    return hashlib.sha1(data).hexdigest()
 
-    if not region:
-        module.fail_json(msg="region must be specified")
 
+def cache_load(path, key, ttl):
+    """ Returns the cached facts or None if absent or expired """
     try:
-        connection = boto.vpc.connect_to_region(
-            region,
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key)
-    except boto.exception.NoAuthHandlerFound, e:
-        module.fail_json(msg=str(e))
+        with open(path, 'r') as fp:
+            cache = json.load(fp)
+    except (IOError, ValueError):
+        return None
+    entry = cache.get(key)
+    if entry is None or time.time() - entry['timestamp'] > ttl:
+        return None
+    return entry['facts']
+
 
-    vpcs = connection.get_all_vpcs()
-    vpcs_w_resources = filter(
-        lambda x: x.tags == module.params.get('resource_tags'), vpcs)
+def cache_store(path, key, facts):
+    try:
+        with open(path, 'r') as fp:
+            cache = json.load(fp)
+    except (IOError, ValueError):
+        cache = {}
+    cache[key] = {'timestamp': time.time(), 'facts': facts}
+
+    # Replace the file atomically: plays may run the module concurrently.
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmpname = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(cache, fp, default=str)
+    os.rename(tmpname, path)
+
+
+def vpc_facts(connection, resource_tags):
+    filters = dict(('tag:%s' % k, v) for k, v in resource_tags.items())
+    vpcs = connection.get_all_vpcs(filters=filters)
+    # The tag filters select VPCs with (at least) these tags; the VPC tags
+    # must match exactly.
+    vpcs_w_resources = filter(lambda x: x.tags == resource_tags, vpcs)
     if len(vpcs_w_resources) != 1:
         if len(vpcs_w_resources) == 0:
-            module.fail_json(msg="No vpc found")
+            return None, "No vpc found"
         else:
-            module.fail_json(msg="Multiple VPCs with specified resource_tags")
+            return None, "Multiple VPCs with specified resource_tags"
 
     vpc = vpcs_w_resources[0]
 
@@ -56,6 +83,50 @@ def main():
             'subnets': data
         }
     }
-    module.exit_json(changed=False, ansible_facts=facts)
+    return facts, None
+
+
+def main():
+    argument_spec = ec2_argument_spec()
+    argument_spec.update(dict(
+        resource_tags=dict(type='dict', required=True),
+        cache_path=dict(),
+        cache_ttl=dict(type='int', default=300),
+        cache_key=dict(default='')
+    ))
+    module = AnsibleModule(argument_spec=argument_spec)
+
+    ec2_url, aws_access_key, aws_secret_key, region = get_ec2_creds(module)
+
+    if not region:
+        module.fail_json(msg="region must be specified")
+
+    resource_tags = module.params.get('resource_tags')
+    cache_path = module.params.get('cache_path')
+    if cache_path:
+        cache_path = os.path.expanduser(cache_path)
+        key = cache_entry_key(region, resource_tags,
+                              module.params.get('cache_key'))
+        facts = cache_load(cache_path, key, module.params.get('cache_ttl'))
+        if facts is not None:
+            module.exit_json(changed=False, ansible_facts=facts, cached=True)
+
+    try:
+        connection = boto.vpc.connect_to_region(
+            region,
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key)
+    except boto.exception.NoAuthHandlerFound, e:
+        module.fail_json(msg=str(e))
+
+    facts, error = vpc_facts(connection, resource_tags)
+    if error:
+        module.fail_json(msg=error)
+
+    if cache_path:
+        cache_store(cache_path, key, facts)
+
+    module.exit_json(changed=False, ansible_facts=facts, cached=False)
 
-main()
+if __name__ == '__main__':
+    main()
@@ -6,79 +6,262 @@
 # It ignores gateway routes and doesn't flush instance routes that are no
 # longer specified.
 #
+# The changes are computed as a diff between the requested routes and the
+# routes present in the table and are applied concurrently (workers) with
+# retries when the EC2 API throttles the requests. In check mode the diff is
+# returned without modifying the table.
+#
+# Several tables can be updated in one call with 'tables', a list of
+# {subnets, routes, state} groups: the route tables of the VPC are listed
+# once, indexed by their set of associated subnets, and the changes of all
+# the groups are applied concurrently. The result has one summary per group.
+#
 
 # import module snippets
 from ansible.module_utils.basic import *
 from ansible.module_utils.ec2 import *
 
 import boto.vpc
+from boto.exception import EC2ResponseError
 
+import random
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
-def rtb_update(connection, rtb, routes):
-    """ Update the table in order to ensure that the route is present """
-    changed = False
-    for route in routes:
+THROTTLING_ERRORS = ['Throttling', 'RequestLimitExceeded']
+
+
+def route_index(rtb):
+    """ Routes present in the table keyed by destination CIDR """
+    return dict((r.destination_cidr_block, r) for r in rtb.routes)
+
+
+def rtb_diff(rtb, routes, state='present'):
+    """ Compute the changes required for the table to match the routes.
+
+    Returns a list of (action, dest, gw) tuples, where action is one of
+    'create', 'replace' or 'delete'.
+    """
+    index = route_index(rtb) if rtb is not None else {}
+    changes = []
+    for route in routes or []:
         if route.get('gw') == 'igw':
             continue
+        existing = index.get(route['dest'])
+        if state == 'absent':
+            if existing is not None:
+                changes.append(('delete', route['dest'], None))
+        elif existing is None:
+            changes.append(('create', route['dest'], route.get('gw')))
+        elif existing.instance_id != route.get('gw'):
+            changes.append(('replace', route['dest'], route.get('gw')))
+    return changes
+
+
+def call_with_retry(fn, retries, *args, **kwargs):
+    """ Call fn, retrying with exponential backoff when throttled. """
+    delay = 1.0
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except EC2ResponseError as ex:
+            if ex.error_code not in THROTTLING_ERRORS or attempt == retries:
+                raise
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay *= 2
 
-        existing_rt = filter(
-            lambda x: x.destination_cidr_block == route['dest'], rtb.routes)
-
-        if len(existing_rt) > 0:
-            if existing_rt[0].instance_id == route.get('gw'):
-                continue
-            success = connection.replace_route(
-                rtb.id, route['dest'], instance_id=route.get('gw'))
-        else:
-            success = connection.create_route(
-                rtb.id, route['dest'], instance_id=route.get('gw'))
-        if success:
-            changed = True
-    return changed
 
+def apply_changes(connection, changes, workers=1, retries=5, connect=None):
+    """ Apply a list of (rtb_id, action, dest, gw) changes, possibly to
+    several tables.
 
-def rtb_delete(connection, rtb, routes):
+    When connect is specified, each worker thread uses its own connection
+    created by connect(); boto connections are not thread safe.
+    Returns the list of results (True if the change was applied).
+    """
+    local = threading.local()
+
+    def get_connection():
+        if connect is None:
+            return connection
+        if not hasattr(local, 'connection'):
+            local.connection = connect()
+        return local.connection
+
+    def apply_change(change):
+        rtb_id, action, dest, gw = change
+        conn = get_connection()
+        if action == 'create':
+            return call_with_retry(conn.create_route, retries,
+                                   rtb_id, dest, instance_id=gw)
+        elif action == 'replace':
+            return call_with_retry(conn.replace_route, retries,
+                                   rtb_id, dest, instance_id=gw)
+        call_with_retry(conn.delete_route, retries, rtb_id, dest)
+        return True
+
+    if workers <= 1 or connect is None or len(changes) <= 1:
+        return map(apply_change, changes)
+    pool = ThreadPool(min(workers, len(changes)))
+    try:
+        return pool.map(apply_change, changes)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def rtb_apply(connection, rtb_id, changes, workers=1, retries=5,
+              connect=None):
+    """ Apply the changes computed by rtb_diff to the table.
+    Returns True if any change was applied.
+    """
+    results = apply_changes(
+        connection, [(rtb_id,) + change for change in changes],
+        workers=workers, retries=retries, connect=connect)
+    return any(results)
+
+
+def rtb_update(connection, rtb, routes, workers=1, connect=None):
+    """ Update the table in order to ensure that the route is present """
+    changes = rtb_diff(rtb, routes, 'present')
+    return rtb_apply(connection, rtb.id, changes, workers=workers,
+                     connect=connect)
+
+
+def rtb_delete(connection, rtb, routes, workers=1, connect=None):
     """ Delete a set of routes from the table """
-    changed = False
-    for route in routes:
-        if route.get('gw') == 'igw':
-            continue
+    changes = rtb_diff(rtb, routes, 'absent')
+    return rtb_apply(connection, rtb.id, changes, workers=workers,
+                     connect=connect)
 
-        existing_rt = filter(
-            lambda x: x.destination_cidr_block == route['dest'], rtb.routes)
-        if len(existing_rt) == 0:
-            continue
 
-        connection.delete_route(rtb.id, route['dest'])
-        changed = True
+def index_tables(tables):
+    """ Route tables keyed by the set of subnets they are associated with """
+    index = {}
+    for rtb in tables:
+        key = frozenset(a.subnet_id for a in rtb.associations)
+        index.setdefault(key, []).append(rtb)
+    return index
+
+
+def tables_update(connection, vpc_id, groups, check_mode=False, workers=1,
+                  retries=5, connect=None):
+    """ Update the route table of each group of subnets.
 
-    return changed
+    groups is a list of dicts with 'subnets', 'routes' and 'state'. The
+    tables of the VPC are listed once; missing tables are created and
+    associated with their subnets, then the changes of all the tables are
+    applied with at most 'workers' requests in flight.
+    Returns (changed, summaries) with one summary dict per group.
+    Raises ValueError if several tables match the subnets of a group.
+    """
+    index = index_tables(connection.get_all_route_tables(
+        filters={'vpc_id': vpc_id}))
+    summaries = []
+    for group in groups:
+        selected = index.get(frozenset(group['subnets']), [])
+        if len(selected) > 1:
+            raise ValueError('Multiple route tables selected for subnets %s'
+                             % ', '.join(group['subnets']))
+        rtb = selected[0] if selected else None
+        changes = rtb_diff(rtb, group.get('routes'),
+                           group.get('state') or 'present')
+        summaries.append({
+            'subnets': group['subnets'],
+            'rtb_id': rtb.id if rtb is not None else None,
+            'created': rtb is None,
+            'changed': rtb is None or len(changes) > 0,
+            'changes': [dict(action=action, dest=dest, gw=gw)
+                        for action, dest, gw in changes],
+        })
+
+    changed = any(summary['changed'] for summary in summaries)
+    if check_mode:
+        return changed, summaries
+
+    def create_table(summary):
+        conn = connect() if connect is not None else connection
+        rtb = call_with_retry(conn.create_route_table, retries, vpc_id)
+        for subnet_id in summary['subnets']:
+            call_with_retry(conn.associate_route_table, retries,
+                            rtb.id, subnet_id)
+        summary['rtb_id'] = rtb.id
+
+    missing = [summary for summary in summaries if summary['created']]
+    if workers <= 1 or connect is None or len(missing) <= 1:
+        map(create_table, missing)
+    else:
+        pool = ThreadPool(min(workers, len(missing)))
+        try:
+            pool.map(create_table, missing)
+        finally:
+            pool.close()
+            pool.join()
+
+    changes = [(summary['rtb_id'], c['action'], c['dest'], c['gw'])
+               for summary in summaries for c in summary['changes']]
+    apply_changes(connection, changes, workers=workers, retries=retries,
+                  connect=connect)
+    return changed, summaries
 
 
 def main():
     argument_spec = ec2_argument_spec()
     argument_spec.update(dict(
         vpc_id=dict(required=True),
-        subnets=dict(type='list', required=True),
+        subnets=dict(type='list'),
+        tables=dict(type='list'),
         routes=dict(type='list'),
-        state=dict(choices=['present', 'absent'], default='present')
+        state=dict(choices=['present', 'absent'], default='present'),
+        workers=dict(type='int', default=4),
+        retries=dict(type='int', default=5)
     ))
 
-    module = AnsibleModule(argument_spec=argument_spec)
+    module = AnsibleModule(argument_spec=argument_spec,
+                           supports_check_mode=True,
+                           mutually_exclusive=[['subnets', 'tables']],
+                           required_one_of=[['subnets', 'tables']])
 
     ec2_url, aws_access_key, aws_secret_key, region = get_ec2_creds(module)
 
     if not region:
         module.fail_json(msg="region must be specified")
 
-    try:
-        connection = boto.vpc.connect_to_region(
+    def connect():
+        return boto.vpc.connect_to_region(
             region,
             aws_access_key_id=aws_access_key,
             aws_secret_access_key=aws_secret_key)
+
+    try:
+        connection = connect()
     except boto.exception.NoAuthHandlerFound, e:
         module.fail_json(msg=str(e))
 
+    if module.params.get('tables') is not None:
+        groups = []
+        for group in module.params.get('tables'):
+            if not isinstance(group, dict) or not group.get('subnets'):
+                module.fail_json(msg="each element of tables requires subnets")
+            # The state of the module applies to the groups without one.
+            group = dict(group, state=group.get('state') or
+                         module.params.get('state'))
+            if group['state'] not in ['present', 'absent']:
+                module.fail_json(msg="invalid state for subnets %s" %
+                                 ', '.join(group['subnets']))
+            groups.append(group)
+        try:
+            changed, summaries = tables_update(
+                connection, module.params.get('vpc_id'), groups,
+                check_mode=module.check_mode,
+                workers=module.params.get('workers'),
+                retries=module.params.get('retries'),
+                connect=connect)
+        except (ValueError, EC2ResponseError) as e:
+            module.fail_json(msg=str(e))
+        module.exit_json(changed=changed, tables=summaries)
+
     tables = connection.get_all_route_tables(
         filters={'vpc_id': module.params.get('vpc_id')}
     )
@@ -89,22 +272,37 @@ def main():
 
     selected_tables = filter(match_by_subnets, tables)
 
-    if len(selected_tables) != 1:
-        if len(selected_tables) > 1:
-            module.fail_json(msg="Multiple route tables selected")
+    if len(selected_tables) > 1:
+        module.fail_json(msg="Multiple route tables selected")
 
+    rtb = selected_tables[0] if selected_tables else None
+    changes = rtb_diff(rtb, module.params.get('routes'),
+                       module.params.get('state'))
+    diff = [dict(action=action, dest=dest, gw=gw)
+            for action, dest, gw in changes]
+
+    if module.check_mode:
+        module.exit_json(changed=rtb is None or len(changes) > 0,
+                         rtb_id=rtb.id if rtb is not None else None,
+                         changes=diff)
+
+    changed = False
+    if rtb is None:
         rtb = connection.create_route_table(module.params.get('vpc_id'))
         for subnet_id in module.params.get('subnets'):
             connection.associate_route_table(rtb.id, subnet_id)
-    else:
-        rtb = selected_tables[0]
+        changed = True
 
-    changed = False
-    if module.params.get('state') == 'present':
-        changed = rtb_update(connection, rtb, module.params.get('routes'))
-    elif module.params.get('state') == 'absent':
-        changed = rtb_delete(connection, rtb, module.params.get('routes'))
+    try:
+        if rtb_apply(connection, rtb.id, changes,
+                     workers=module.params.get('workers'),
+                     retries=module.params.get('retries'),
+                     connect=connect):
+            changed = True
+    except EC2ResponseError as e:
+        module.fail_json(msg=str(e), rtb_id=rtb.id)
 
-    module.exit_json(changed=changed, rtb_id=rtb.id)
+    module.exit_json(changed=changed, rtb_id=rtb.id, changes=diff)
 
-main()
+if __name__ == '__main__':
+    main()
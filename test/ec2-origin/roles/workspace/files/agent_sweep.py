@@ -0,0 +1,142 @@
+"""
+Health sweep of the vrouter agents through their introspect interface.
+
+Each agent is queried for its XMPP peers, interfaces, VRFs and the routes of
+the fabric VRF. The per-node summaries are compared across the fleet: a node
+whose counts deviate from the fleet median is flagged as an outlier.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from sandesh_introspect import VROUTER_AGENT_PORT, IntrospectClient
+
+FABRIC_VRF_INDEX = 0
+
+# Counters compared with the fleet median.
+OUTLIER_METRICS = ['interfaces', 'vrfs', 'routes']
+
+
+def agent_summary(channel, timeout=30):
+    """ Introspect counters of the agent running on the host. Raises
+    ParseError if the agent introspect does not respond and
+    transport.CommandTimeout if its response is not complete in time.
+    """
+    client = IntrospectClient(channel, VROUTER_AGENT_PORT, timeout=timeout)
+    summary = {
+        'xmpp_peers': 0,
+        'xmpp_established': 0,
+        'interfaces': 0,
+        'interfaces_inactive': 0,
+        'vrfs': 0,
+        'routes': 0,
+    }
+    for peer in client.iter_items('AgentXmppConnectionStatusReq',
+                                  'AgentXmppData'):
+        summary['xmpp_peers'] += 1
+        if peer.findtext('state') == 'Established':
+            summary['xmpp_established'] += 1
+    # The tables are only counted: scan them without building the elements.
+    interfaces, active = client.count_matches(
+        'ItfReq', [r'<ItfSandeshData\b', r'<active\b[^>]*>Active<'])
+    summary['interfaces'] = interfaces
+    summary['interfaces_inactive'] = interfaces - active
+    summary['vrfs'], = client.count_matches('VrfListReq',
+                                            [r'<VrfSandeshData\b'])
+    summary['routes'], = client.count_matches('Inet4UcRouteReq',
+                                              [r'<RouteUcSandeshData\b'],
+                                              uc_index=FABRIC_VRF_INDEX)
+    return summary
+
+
+def sweep_agents(hosts, pool, workers=32, timeout=30):
+    """ Query the agents of the hosts with at most 'workers' in flight.
+
+    Returns a dict keyed by host with the agent_summary, or with an 'error'
+    entry when the agent could not be queried.
+    """
+
+    def query(host):
+        try:
+            return host, agent_summary(pool.get(host), timeout=timeout)
+        except Exception as ex:
+            return host, {'error': '%s: %s' % (type(ex).__name__, ex)}
+
+    if not hosts:
+        return {}
+    thread_pool = ThreadPool(max(1, min(workers, len(hosts))))
+    try:
+        return dict(thread_pool.map(query, hosts))
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def agent_failures(summary):
+    """ Conditions that prevent the node from forwarding traffic """
+    if 'error' in summary:
+        return ['introspect unavailable']
+    problems = []
+    if summary['xmpp_established'] == 0:
+        problems.append('no xmpp session')
+    elif summary['xmpp_established'] < summary['xmpp_peers']:
+        problems.append('xmpp %d/%d established' % (
+            summary['xmpp_established'], summary['xmpp_peers']))
+    return problems
+
+
+def agent_problems(summary):
+    """ agent_failures() and the conditions that are only reported: an
+    interface is inactive while its pod is being created or deleted.
+    """
+    problems = agent_failures(summary)
+    if 'error' not in summary and summary['interfaces_inactive']:
+        problems.append('%d inactive interfaces' %
+                        summary['interfaces_inactive'])
+    return problems
+
+
+def find_outliers(summaries, tolerance=0.5):
+    """ Returns a dict keyed by host with the list of metrics that deviate
+    from the fleet median by more than tolerance (relative).
+    """
+    valid = dict((host, s) for host, s in summaries.items()
+                 if 'error' not in s)
+    outliers = {}
+    if len(valid) < 3:
+        return outliers
+    for metric in OUTLIER_METRICS:
+        center = median([s[metric] for s in valid.values()])
+        if center == 0:
+            continue
+        for host, summary in valid.items():
+            if abs(summary[metric] - center) > tolerance * center:
+                outliers.setdefault(host, []).append(
+                    '%s %d (median %g)' % (metric, summary[metric], center))
+    return outliers
+
+
+def print_sweep(hosts, summaries, outliers):
+    """ One line per host; the hosts with problems are flagged. """
+    print 'Agent sweep (%d hosts):' % len(hosts)
+    print '  %-20s %-6s %10s %6s %8s  %s' % (
+        'host', 'xmpp', 'interfaces', 'vrfs', 'routes', 'flags')
+    for host in hosts:
+        summary = summaries[host]
+        flags = agent_problems(summary) + outliers.get(host, [])
+        if 'error' in summary:
+            print '  %-20s %s (%s)' % (host, ', '.join(flags),
+                                       summary['error'])
+            continue
+        print '  %-20s %-6s %10d %6d %8d  %s' % (
+            host, '%d/%d' % (summary['xmpp_established'],
+                             summary['xmpp_peers']),
+            summary['interfaces'], summary['vrfs'], summary['routes'],
+            ', '.join(flags))
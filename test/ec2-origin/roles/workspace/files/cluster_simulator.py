@@ -0,0 +1,420 @@
+"""
+Offline transports for opencontrail_validate.
+
+ReplayExecutor answers the commands from a list of rules instead of
+executing them on a host. ClusterSimulator generates the rules of a cluster
+with a master, gateways and any number of nodes, so that the concurrency and
+the parsing of the validator can be exercised on large clusters without
+real machines.
+"""
+
+import collections
+import json
+import re
+import time
+
+from transport import BaseExecutor
+
+# Ports checked by contrail_services_status.
+CONTRAIL_PORTS = [8082, 8444, 5269, 9160, 2181, 5672]
+
+MASTER_CONTAINERS = ['contrail-control', 'contrail-api', 'contrail-schema',
+                     'ifmap-server', 'kube-network-manager']
+
+
+class ReplayExecutor(BaseExecutor):
+    """ Executor that replays canned output.
+
+    rules is a list of (pattern, response) pairs, where pattern is a regexp
+    (string or compiled); the response of the first pattern found
+    (re.search) in the command is used. A response is the stdout string, a
+    (stdout, stderr) tuple or a callable that receives the match object and
+    returns one of those. Each command (or batch of
+    commands) sleeps for latency seconds to model the round trip to the
+    host.
+    """
+    CHUNK_SIZE = 32768
+
+    def __init__(self, rules, latency=0.0):
+        super(ReplayExecutor, self).__init__()
+        self._rules = [(re.compile(pattern), response)
+                       for pattern, response in rules]
+        self._latency = latency
+        self.calls = collections.Counter()
+
+    def _respond(self, cmd):
+        for pattern, response in self._rules:
+            match = pattern.search(cmd)
+            if match:
+                break
+        else:
+            return '', 'sh: %s: command not found\n' % cmd.split()[0]
+        if callable(response):
+            response = response(match)
+        if isinstance(response, basestring):
+            return response, ''
+        return response
+
+    def _lines(self, cmd):
+        stdout, stderr = self._respond(cmd)
+        return stdout.splitlines(True), stderr.splitlines(True)
+
+    def _exec_command(self, cmd, sudo):
+        self.calls['run'] += 1
+        if self._latency:
+            time.sleep(self._latency)
+        return self._lines(cmd)
+
+    def run_batch(self, commands, sudo=False):
+        """ Models the output of the batch script of BaseExecutor (markers
+        and, with sudo, stderr merged into stdout by the pty) so that it is
+        split back by the same code as the output of a real host.
+        """
+        self.calls['run'] += 1
+        if self._latency:
+            time.sleep(self._latency)
+        marker = BaseExecutor.BATCH_MARKER + '\n'
+        stdout, stderr = [], []
+        for cmd in commands:
+            out, err = self._respond(cmd)
+            if sudo:
+                stdout.extend([err, out, '\n', marker])
+            else:
+                stdout.extend([out, '\n', marker])
+                stderr.extend([err, marker])
+        stdout, stderr = ''.join(stdout), ''.join(stderr)
+        if sudo:
+            stdout = stdout.replace('\n', '\r\n')
+        return BaseExecutor._batch_results(
+            stdout.splitlines(True), stderr.splitlines(True), len(commands),
+            sudo)
+
+    def stream(self, cmd, timeout, sudo=False):
+        self.calls['stream'] += 1
+        if self._latency:
+            time.sleep(self._latency)
+        stdout, _ = self._respond(cmd)
+        for i in range(0, len(stdout), ReplayExecutor.CHUNK_SIZE):
+            yield stdout[i:i + ReplayExecutor.CHUNK_SIZE]
+
+
+def load_replay(filename, latency=0.0):
+    """ Returns an executor factory for the rules in a JSON file:
+
+    {"<host>": [["<pattern>", "<stdout>"], ...],
+     "*": [["<pattern>", ["<stdout>", "<stderr>"]], ...]}
+
+    The rules of a host are followed by the "*" rules.
+    """
+    with open(filename, 'r') as fp:
+        data = json.load(fp)
+    data.setdefault('*', [])
+
+    def rules(host):
+        return [(pattern, tuple(response) if isinstance(response, list)
+                 else response)
+                for pattern, response in data.get(host, []) + data['*']]
+
+    return lambda host: ReplayExecutor(rules(host), latency=latency)
+
+
+def netstat_listen(ports):
+    """ netstat -ntl """
+    lines = ['Active Internet connections (only servers)\n',
+             'Proto Recv-Q Send-Q Local Address           Foreign Address'
+             '         State      \n']
+    for i, port in enumerate(ports):
+        if i % 2:
+            lines.append('tcp6       0      0 :::%-20d :::*'
+                         '                    LISTEN     \n' % port)
+        else:
+            lines.append('tcp        0      0 0.0.0.0:%-15d 0.0.0.0:*'
+                         '               LISTEN     \n' % port)
+    return ''.join(lines)
+
+
+def netstat_established(port, peers):
+    """ netstat -nt lines of the sessions accepted on port """
+    return ''.join('tcp        0      0 10.0.0.1:%d           %s:%d'
+                   '      ESTABLISHED\n' % (port, peer, 40000 + i)
+                   for i, peer in enumerate(peers))
+
+
+def docker_ps(names, count=0):
+    """ docker ps --format='{{.ID}} {{.Names}}' with count pod containers
+    following the named containers.
+    """
+    lines = ['%012x %s\n' % (0xa00000 + i, name)
+             for i, name in enumerate(names)]
+    lines.extend('%012x k8s_pod-%d_app-%d\n' % (0xb00000 + i, i, i)
+                 for i in range(count))
+    return ''.join(lines)
+
+
+def vif_list(count, gateway_vrf=3):
+    """ vif --list; the gateway1 interface is in the middle of the list """
+    lines = ['Vrouter Interface Table\n', '\n']
+    for i in range(count):
+        name = 'gateway1' if i == count / 2 else 'tap%08x-%02x' % (i, i % 256)
+        vrf = gateway_vrf if name == 'gateway1' else i % 100
+        lines.extend([
+            'vif0/%d      OS: %s\n' % (i, name),
+            '            Type:Virtual HWaddr:00:00:5e:00:01:00 IPaddr:0\n',
+            '            Vrf:%d Flags:PL3L2D MTU:9160 Ref:5\n' % vrf,
+            '            RX packets:0  bytes:0 errors:0\n',
+            '            TX packets:0  bytes:0 errors:0\n',
+            '\n',
+        ])
+    return ''.join(lines)
+
+
+def routing_instances(count, deleted=0):
+    """ Snh_ShowRoutingInstanceSummaryReq response """
+    parts = ['<?xml-stylesheet type="text/xsl" href="/universal_parse.xsl"?>',
+             '<ShowRoutingInstanceSummaryResp type="sandesh">',
+             '<instances type="list" identifier="1">',
+             '<list type="struct" size="%d">' % count]
+    for i in range(count):
+        parts.append(
+            '<ShowRoutingInstance>'
+            '<name type="string" identifier="1">default-domain:test:vn%d:vn%d'
+            '</name>'
+            '<virtual_network type="string">default-domain:test:vn%d'
+            '</virtual_network>'
+            '<vn_index type="i32">%d</vn_index>'
+            '<deleted type="bool">%s</deleted>'
+            '</ShowRoutingInstance>' %
+            (i, i, i, i, 'true' if i < deleted else 'false'))
+    parts.append('</list></instances></ShowRoutingInstanceSummaryResp>')
+    return ''.join(parts)
+
+
+def unicast_routes(count, hosts=()):
+    """ Snh_Inet4UcRouteReq response with count /24 routes followed by a
+    /32 route for each of the host addresses.
+    """
+    parts = ['<?xml-stylesheet type="text/xsl" href="/universal_parse.xsl"?>',
+             '<Inet4UcRouteResp type="sandesh">',
+             '<route_list type="list" identifier="1">',
+             '<list type="struct" size="%d">' % (count + len(hosts))]
+    prefixes = [('10.%d.%d.0' % (32 + i / 256, i % 256), 24)
+                for i in range(count)]
+    for ip, plen in prefixes + [(host, 32) for host in hosts]:
+        parts.append(
+            '<RouteUcSandeshData>'
+            '<src_ip type="string" identifier="1">%s</src_ip>'
+            '<src_plen type="i32" identifier="2">%d</src_plen>'
+            '<src_vrf type="string">default-domain:default:gw:gw</src_vrf>'
+            '<path_list type="list"><list type="struct" size="1">'
+            '<PathSandeshData><nh><NhSandeshData>'
+            '<type type="string">tunnel</type>'
+            '</NhSandeshData></nh>'
+            '<peer type="string">10.0.0.10</peer>'
+            '</PathSandeshData></list></path_list>'
+            '</RouteUcSandeshData>' % (ip, plen))
+    parts.append('</list></route_list></Inet4UcRouteResp>')
+    return ''.join(parts)
+
+
+def agent_xmpp_peers(controllers):
+    """ Snh_AgentXmppConnectionStatusReq response """
+    parts = ['<AgentXmppConnectionStatus type="sandesh">',
+             '<peer type="list" identifier="1">',
+             '<list type="struct" size="%d">' % len(controllers)]
+    for controller in controllers:
+        parts.append(
+            '<AgentXmppData>'
+            '<controller_ip type="string" identifier="1">%s</controller_ip>'
+            '<state type="string" identifier="2">Established</state>'
+            '<cfg_controller type="string" identifier="4">Yes'
+            '</cfg_controller>'
+            '</AgentXmppData>' % controller)
+    parts.append('</list></peer></AgentXmppConnectionStatus>')
+    return ''.join(parts)
+
+
+def agent_interfaces(count):
+    """ Snh_ItfReq response: vhost0, pkt0 and count-2 virtual ports """
+    parts = ['<ItfResp type="sandesh">',
+             '<itf_list type="list" identifier="1">',
+             '<list type="struct" size="%d">' % count]
+    for i in range(count):
+        name = ['vhost0', 'pkt0'][i] if i < 2 else 'tap%08x-%02x' % (i, i)
+        parts.append(
+            '<ItfSandeshData>'
+            '<index type="i32" identifier="1">%d</index>'
+            '<name type="string" identifier="2">%s</name>'
+            '<active type="string" identifier="4">Active</active>'
+            '</ItfSandeshData>' % (i, name))
+    parts.append('</list></itf_list></ItfResp>')
+    return ''.join(parts)
+
+
+def agent_vrfs(count):
+    """ Snh_VrfListReq response: the fabric VRF and count-1 VRFs """
+    parts = ['<VrfListResp type="sandesh">',
+             '<vrf_list type="list" identifier="1">',
+             '<list type="struct" size="%d">' % count]
+    for i in range(count):
+        name = ('default-domain:default-project:ip-fabric:__default__'
+                if i == 0 else 'default-domain:test:vn%d:vn%d' % (i, i))
+        parts.append(
+            '<VrfSandeshData>'
+            '<name type="string" identifier="1">%s</name>'
+            '<ucindex type="u32" identifier="2">%d</ucindex>'
+            '</VrfSandeshData>' % (name, i))
+    parts.append('</list></vrf_list></VrfListResp>')
+    return ''.join(parts)
+
+
+def pod(name, generate_name, phase, namespace='default', node=None):
+    return {
+        'kind': 'Pod',
+        'metadata': {
+            'name': name,
+            'generateName': generate_name,
+            'namespace': namespace,
+            'resourceVersion': str(abs(hash(name)) % 100000),
+            'labels': {'app': generate_name.rstrip('-')},
+        },
+        'spec': {
+            'containers': [{'name': 'app', 'image': 'openshift/app'}],
+            'nodeName': node or 'origin-node-1',
+        },
+        'status': {'phase': phase, 'podIP': '10.32.0.1'},
+    }
+
+
+def default_pods(count):
+    """ count application pods followed by the system pods """
+    items = [pod('app-%d-x%04d' % (i / 10, i), 'app-%d-' % (i / 10),
+                 'Running' if i % 7 else 'Pending')
+             for i in range(count)]
+    items.append(pod('docker-registry-1-abcde', 'docker-registry-1-',
+                     'Running'))
+    items.append(pod('router-1-fghij', 'router-1-', 'Running'))
+    return items
+
+
+def application_pods():
+    """ Pods of the rails-postgresql-example application (test namespace) """
+    return [
+        pod('rails-postgresql-example-1-build', 'rails-postgresql-example-1-',
+            'Succeeded', 'test'),
+        pod('postgresql-1-klmno', 'postgresql-1-', 'Running', 'test'),
+        pod('rails-postgresql-example-1-pqrst', 'rails-postgresql-example-1-',
+            'Running', 'test'),
+    ]
+
+
+def pod_lines(items):
+    """ oc get pods -o template with pod_state.POD_TEMPLATE (one line per
+    pod, also the output of --watch)
+    """
+    return ''.join('%s\t%s\t%s\t%s\t<no value>\n' % (
+        item['metadata']['name'], item['metadata']['generateName'],
+        item['status']['phase'], item['metadata']['resourceVersion'])
+        for item in items)
+
+
+def pod_table(items):
+    """ oc get pods """
+    lines = ['NAME                      READY     STATUS    RESTARTS   AGE\n']
+    lines.extend('%-25s 1/1       %-9s 0          1h\n' % (
+        item['metadata']['name'], item['status']['phase']) for item in items)
+    return ''.join(lines)
+
+
+def fping_summary(match):
+    """ fping -q output for the addresses of the probe command """
+    count = int(match.group(1))
+    return ''.join(
+        '%s : xmt/rcv/%%loss = %d/%d/0%%, min/avg/max = 0.05/0.08/0.12\n' % (
+            address, count, count)
+        for address in match.group(2).split())
+
+
+class ClusterSimulator(object):
+    """ Command output of a simulated cluster.
+
+    The cluster has one master, 'gateways' gateways and 'nodes' nodes. The
+    master runs 'pods' application pods (in addition to the system pods);
+    each gateway VRF has 'routes' routes, each agent 'interfaces' interfaces
+    and 'vrfs' VRFs. The vrouter-agent is not running on the first 'faulty'
+    nodes.
+    """
+
+    def __init__(self, nodes, gateways=1, services=16, pods=0, routes=1000,
+                 interfaces=100, vrfs=10, instances=10, faulty=0,
+                 latency=0.0):
+        self._latency = latency
+        self._hosts = {
+            'masters': ['10.0.0.1'],
+            'gateways': ['10.0.1.%d' % (1 + i) for i in range(gateways)],
+            'nodes': ['10.0.%d.%d' % (2 + i / 250, 1 + i % 250)
+                      for i in range(nodes)],
+        }
+        self._roles = dict((host, group)
+                           for group, hosts in self._hosts.items()
+                           for host in hosts)
+        for host in self._hosts['nodes'][:faulty]:
+            self._roles[host] = 'faulty'
+        service_ips = ['10.65.%d.%d' % (i / 250, 1 + i % 250)
+                       for i in range(services)]
+        agents = self._hosts['gateways'] + self._hosts['nodes']
+
+        # The rules are generated once and shared by the executors; the
+        # probe rule is common to all the hosts.
+        probe = [(r'fping -q -c (\d+) (.*?) 2>&1;', fping_summary)]
+        agent_running = [
+            (r'^docker ps', docker_ps(['vrouter-agent'], count=10))]
+        agent_down = [(r'^docker ps', docker_ps([], count=10))]
+        introspect = [
+            (r'Snh_AgentXmppConnectionStatusReq',
+             agent_xmpp_peers(self._hosts['masters'])),
+            (r'Snh_ItfReq', agent_interfaces(interfaces)),
+            (r'Snh_VrfListReq', agent_vrfs(vrfs)),
+            (r"Snh_Inet4UcRouteReq\?uc_index=0'",
+             unicast_routes(0, agents)),
+        ]
+
+        pods_default = default_pods(pods)
+        pods_test = application_pods()
+        self._rules = {
+            'masters': [
+                (r'^curl http://localhost:8082$',
+                 '{"href": "http://localhost:8082", "links": []}\n'),
+                (r'^netstat -ntl$', netstat_listen(CONTRAIL_PORTS)),
+                (r'^netstat -nt \|', netstat_established(5269, agents)),
+                (r'^docker ps', docker_ps(MASTER_CONTAINERS)),
+                (r'^oc get pods .*-o template .*--namespace=test$',
+                 pod_lines(pods_test)),
+                (r'^oc get pods .*-o template ', pod_lines(pods_default)),
+                (r'^oc get pods$', pod_table(pods_default)),
+                (r'^oc get svc -o jsonpath',
+                 ' '.join(service_ips) + '\n'),
+                (r'Snh_ShowRoutingInstanceSummaryReq',
+                 routing_instances(instances)),
+            ] + probe,
+            'gateways': agent_running + introspect + [
+                (r'^vif --list$', vif_list(interfaces)),
+                (r'Snh_Inet4UcRouteReq', unicast_routes(routes, service_ips)),
+                (r'curl http://\S+/articles',
+                 '<h1>Listing articles</h1>\n'),
+            ] + probe,
+            'nodes': agent_running + introspect + probe,
+            'faulty': agent_down + probe,
+        }
+        for role, rules in self._rules.items():
+            self._rules[role] = [(re.compile(pattern), response)
+                                 for pattern, response in rules]
+
+    def inventory(self):
+        """ Host addresses by group, as returned by inventory_parse """
+        return dict((group, list(hosts))
+                    for group, hosts in self._hosts.items())
+
+    def executor(self, host):
+        """ ExecutorPool factory """
+        return ReplayExecutor(self._rules[self._roles[host]],
+                              latency=self._latency)
@@ -0,0 +1,100 @@
+"""
+Parsers for the output of the commands executed by opencontrail_validate.
+
+The parsers are generators over any iterable of lines: the lines returned
+by BaseExecutor.run() or the lines of a streamed command (iter_lines), so
+that large outputs are processed as they are received and a check can stop
+reading as soon as it has its answer.
+"""
+
+import re
+
+re_netstat_listen = re.compile(
+    r'tcp6?\s+\d+\s+\d+\s+(\S+):(\d+)\s+\S+\s+LISTEN')
+re_docker_ps = re.compile(r'([a-f0-9]+)\s([\w-]+)')
+re_vif_section = re.compile(r'vif0/(\d+)\s+OS:\s(\S+)')
+re_vif_vrf = re.compile(r'Vrf:(\d+)')
+re_fping = re.compile(r'(\S+)\s+:\s+xmt/rcv/%loss = (\d+)/(\d+)/\d+%'
+                      r'(?:, min/avg/max = ([\d.]+)/([\d.]+)/([\d.]+))?')
+re_ping_count = re.compile(r'(\S+) (\d+) packets transmitted, (\d+) '
+                           r'(?:packets )?received')
+re_ping_rtt = re.compile(r'(\S+) (?:rtt|round-trip) min/avg/max(?:/\S+)? = '
+                         r'([\d.]+)/([\d.]+)/([\d.]+)')
+
+
+def iter_lines(chunks):
+    """ Split a sequence of data chunks into lines (newline included) """
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def listen_ports(lines):
+    """ (address, port) of the listening sockets in 'netstat -ntl' """
+    for line in lines:
+        m = re_netstat_listen.match(line)
+        if m:
+            yield m.group(1), int(m.group(2))
+
+
+def docker_containers(lines, unparsed=None):
+    """ (id, name) of the containers in docker ps --format='{{.ID}}
+    {{.Names}}'. Lines that do not match are appended to unparsed.
+    """
+    for line in lines:
+        m = re_docker_ps.match(line)
+        if m:
+            yield m.group(1), m.group(2)
+        elif unparsed is not None:
+            unparsed.append(line)
+
+
+def vif_interfaces(lines):
+    """ (index, name, vrf) of the interfaces in 'vif --list'; vrf is None
+    when the section has no Vrf field.
+    """
+    current = None
+    for line in lines:
+        m = re_vif_section.match(line)
+        if m:
+            if current is not None:
+                yield tuple(current)
+            current = [int(m.group(1)), m.group(2), None]
+            continue
+        if current is not None and current[2] is None:
+            m = re_vif_vrf.search(line)
+            if m:
+                current[2] = int(m.group(1))
+    if current is not None:
+        yield tuple(current)
+
+
+def ping_statistics(lines):
+    """ (address, statistics) for the output of 'fping -q' or of ping
+    with each line prefixed by the address. statistics is a dict with a
+    subset of 'transmitted', 'received' and 'rtt' (min, avg, max); an
+    address may be reported over several lines.
+    """
+    for line in lines:
+        m = re_fping.match(line)
+        if m:
+            stats = {'transmitted': int(m.group(2)),
+                     'received': int(m.group(3))}
+            if m.group(4):
+                stats['rtt'] = tuple(float(v) for v in m.group(4, 5, 6))
+            yield m.group(1), stats
+            continue
+        m = re_ping_count.match(line)
+        if m:
+            yield m.group(1), {'transmitted': int(m.group(2)),
+                               'received': int(m.group(3))}
+            continue
+        m = re_ping_rtt.match(line)
+        if m:
+            yield m.group(1), {'rtt': tuple(float(v)
+                                            for v in m.group(2, 3, 4))}
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+
+"""
+Ansible dynamic inventory of an openshift + opencontrail cluster on EC2.
+
+The inventory only lists the hosts of the masters, etcd, gateways and nodes
+groups: it is meant for the tools that need the host addresses
+(opencontrail_validate.py, vrouter_rollout.py). It does not define the
+OSEv3 and opencontrail parent groups nor their variables (ansible_ssh_user,
+deployment_type, opencontrail_*), which are set in the static inventory
+created by the cluster role (inventory.j2): the deploy playbooks must use
+the static inventory. The CI jobs do not use this script either, as the
+deployer has no EC2 credentials.
+
+The running instances of the cluster (Cluster tag) are listed with one
+DescribeInstances sweep and grouped by their Name tag into the masters (and
+etcd), gateways and nodes groups. Hosts are named after the group and their
+position (e.g. origin-node-3) and ansible_ssh_host is the private address.
+The hosts of a group are numbered in launch order (launch time, then
+instance id), as in the static inventory (roles/cluster inventory.j2), so
+that a host name designates the same instance in both inventories and
+instances added later do not renumber the existing ones.
+
+The inventory is cached on disk as JSON for --cache-ttl seconds, so that
+successive ansible-playbook runs do not query EC2. --host is answered from
+the hostvars of the (cached) inventory.
+
+The script reads its defaults from the environment, as ansible calls it
+with --list / --host only: EC2_INVENTORY_REGION, EC2_INVENTORY_CLUSTER,
+EC2_INVENTORY_CACHE and EC2_INVENTORY_CACHE_TTL.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import boto.ec2
+
+# (group, Name tag regexp, host name prefix)
+GROUP_PATTERNS = [
+    ('masters', r'^origin-master-', 'origin-master'),
+    ('gateways', r'^origin-gateway-', 'origin-gateway'),
+    ('nodes', r'^origin-node-', 'origin-node'),
+]
+
+# Groups that contain the hosts of another group.
+GROUP_ALIASES = {'etcd': 'masters'}
+
+PAGE_SIZE = 1000
+
+
+def iter_instances(connection, filters, page_size=PAGE_SIZE):
+    """ Generator over the instances of a paginated DescribeInstances """
+    next_token = None
+    while True:
+        reservations = connection.get_all_reservations(
+            filters=filters, max_results=page_size, next_token=next_token)
+        for reservation in reservations:
+            for instance in reservation.instances:
+                yield instance
+        next_token = reservations.next_token
+        if not next_token:
+            break
+
+
+def build_inventory(instances, patterns=GROUP_PATTERNS,
+                    aliases=GROUP_ALIASES):
+    """ Inventory (ansible --list format, with _meta hostvars) of the
+    instances. The hosts of a group are numbered in launch order.
+    """
+    compiled = [(group, re.compile(regexp), prefix)
+                for group, regexp, prefix in patterns]
+    members = dict((group, []) for group, _, _ in patterns)
+    for instance in instances:
+        name = instance.tags.get('Name', '')
+        for group, regexp, _ in compiled:
+            if regexp.match(name):
+                members[group].append(instance)
+                break
+
+    inventory = {'_meta': {'hostvars': {}}}
+    hostvars = inventory['_meta']['hostvars']
+    for group, _, prefix in compiled:
+        hosts = []
+        ordered = sorted(members[group],
+                         key=lambda i: (i.launch_time, i.id))
+        for index, instance in enumerate(ordered, 1):
+            host = '%s-%d' % (prefix, index)
+            hosts.append(host)
+            hostvars[host] = {
+                'ansible_ssh_host': instance.private_ip_address,
+                'ec2_id': instance.id,
+                'ec2_public_dns_name': instance.public_dns_name,
+                'ec2_private_dns_name': instance.private_dns_name,
+            }
+        inventory[group] = {'hosts': hosts}
+    for alias, group in aliases.items():
+        inventory[alias] = {'hosts': list(inventory[group]['hosts'])}
+    return inventory
+
+
+def cache_load(path, key, ttl):
+    """ Returns the cached inventory or None if absent or expired """
+    try:
+        with open(path, 'r') as fp:
+            entry = json.load(fp)
+    except (IOError, ValueError):
+        return None
+    if entry.get('key') != key or time.time() - entry['timestamp'] > ttl:
+        return None
+    return entry['inventory']
+
+
+def cache_store(path, key, inventory):
+    # Replace the file atomically: ansible may run the script concurrently.
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmpname = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, 'w') as fp:
+        json.dump({'key': key, 'timestamp': time.time(),
+                   'inventory': inventory}, fp)
+    os.rename(tmpname, path)
+
+
+def fetch_inventory(region, cluster):
+    connection = boto.ec2.connect_to_region(region)
+    filters = {'instance-state-name': 'running'}
+    if cluster:
+        filters['tag:Cluster'] = cluster
+    return build_inventory(iter_instances(connection, filters))
+
+
+def load_inventory(region, cluster, cache=None, ttl=300, refresh=False):
+    """ Inventory from the cache when it is fresh, from EC2 otherwise """
+    key = '%s %s' % (region, cluster or '')
+    if cache and not refresh:
+        inventory = cache_load(cache, key, ttl)
+        if inventory is not None:
+            return inventory
+    inventory = fetch_inventory(region, cluster)
+    if cache:
+        cache_store(cache, key, inventory)
+    return inventory
+
+
+def host_index(inventory):
+    """ hostvars keyed by host name and by address """
+    index = dict(inventory['_meta']['hostvars'])
+    for hostvars in inventory['_meta']['hostvars'].values():
+        index.setdefault(hostvars['ansible_ssh_host'], hostvars)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--list', action='store_true')
+    parser.add_argument('--host')
+    parser.add_argument('--region',
+                        default=os.environ.get('EC2_INVENTORY_REGION'))
+    parser.add_argument('--cluster',
+                        default=os.environ.get('EC2_INVENTORY_CLUSTER'),
+                        help='Value of the Cluster tag of the instances')
+    parser.add_argument('--cache',
+                        default=os.environ.get(
+                            'EC2_INVENTORY_CACHE',
+                            '~/.ansible/ec2-inventory.json'))
+    parser.add_argument('--cache-ttl', type=int,
+                        default=int(os.environ.get('EC2_INVENTORY_CACHE_TTL',
+                                                   300)))
+    parser.add_argument('--refresh-cache', action='store_true')
+    args = parser.parse_args()
+
+    if not args.region:
+        parser.error('region must be specified (EC2_INVENTORY_REGION)')
+
+    if args.cache:
+        args.cache = os.path.expanduser(args.cache)
+        dirname = os.path.dirname(os.path.abspath(args.cache))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+    inventory = load_inventory(args.region, args.cluster, cache=args.cache,
+                               ttl=args.cache_ttl,
+                               refresh=args.refresh_cache)
+    if args.host:
+        result = host_index(inventory).get(args.host, {})
+    else:
+        result = inventory
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
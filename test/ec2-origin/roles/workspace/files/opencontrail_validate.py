@@ -6,79 +6,146 @@ Sanity check the status of an openshift + opencontrail cluster
 
 import ConfigParser
 import argparse
+import functools
+import hashlib
 import json
-import paramiko
+import os
+import random
 import re
+import subprocess
 import sys
 import time
-import xml.etree.ElementTree
-from datetime import datetime
-
-
-class Executor(object):
-    DEFAULT_USERNAME = 'centos'
-
-    def __init__(self, server):
-        """ Constructor """
-        self._ssh_client = paramiko.SSHClient()
-        self._ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self._ssh_client.connect(server, username=Executor.DEFAULT_USERNAME)
-
-    def run(self, cmd, sudo=False):
-        if sudo:
-            cmd = 'sudo ' + cmd
-        _, stdout, stderr = self._ssh_client.exec_command(cmd, get_pty=sudo)
-        stdout.channel.recv_exit_status()
-        return stdout.readlines(), stderr.readlines()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, type, value, traceback):
-        self._ssh_client.close()
+from multiprocessing.pool import ThreadPool
+
+import agent_sweep
+import command_parsers
+from cluster_simulator import ClusterSimulator, load_replay
+from pod_state import PodView, parse_pod_lines, pod_command
+from sandesh_introspect import (
+    CONTROL_NODE_PORT, VROUTER_AGENT_PORT, IntrospectClient, ParseError)
+from transport import CommandTimeout, ExecutorPool
+from validation_cache import ValidationCache
+from validation_report import ValidationReport, count_attempt
+
+# Scales the deadline of all the wait loops (--timeout-factor).
+TIMEOUT_FACTOR = 1.0
+
+
+def wait_until(condition, timeout, interval=2.0, max_interval=30.0,
+               factor=2.0, jitter=0.2):
+    """ Call condition() until it returns a true value or timeout expires.
+
+    The delay between attempts starts at interval and grows exponentially
+    up to max_interval, with +/- jitter (fraction of the delay) so that
+    concurrent waiters do not poll in lock step. Returns the last value
+    returned by condition.
+    """
+    deadline = time.time() + timeout * TIMEOUT_FACTOR
+    delay = interval
+    while True:
+        count_attempt()
+        result = condition()
+        remaining = deadline - time.time()
+        if result or remaining <= 0:
+            return result
+        sleep = delay * random.uniform(1 - jitter, 1 + jitter)
+        time.sleep(min(sleep, remaining))
+        delay = min(delay * factor, max_interval)
+
+
+def pod_list(channel, namespace=None):
+    """ Returns the PodState of the pods listed by 'oc get pods' """
+    return list(parse_pod_lines(channel.run_lines(pod_command(namespace))))
+
+
+def watch_pods(channel, predicate, timeout, namespace=None):
+    """ Wait until predicate(pods) is true, where pods is the list of the
+    PodState of the pods currently known.
+
+    Streams 'oc get pods --watch' so that the predicate is re-evaluated as
+    soon as a pod changes state instead of re-listing all the pods at fixed
+    intervals. If the watch terminates early, falls back to polling for the
+    remaining time; the predicate is only re-evaluated when the listing
+    changed. Returns the last predicate value.
+    """
+    deadline = time.time() + timeout * TIMEOUT_FACTOR
+    view = PodView()
+    result = [None, False]
 
-    def __del__(self):
-        """ Destructor """
-        self._ssh_client.close()
+    stream = channel.stream(pod_command(namespace, watch=True),
+                            deadline - time.time())
+    pending = ''
+    try:
+        for data in stream:
+            lines = (pending + data).split('\n')
+            pending = lines.pop()
+            if view.update(parse_pod_lines(lines)):
+                count_attempt()
+                result[:] = [predicate(view.pods()), True]
+                if result[0]:
+                    stream.close()
+                    return result[0]
+    except CommandTimeout:
+        # The watch does not terminate by itself.
+        pass
+
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return result[0]
+
+    def poll():
+        changed = view.replace(pod_list(channel, namespace))
+        if changed or not result[1]:
+            result[:] = [predicate(view.pods()), True]
+        return result[0]
+
+    return wait_until(poll, remaining / TIMEOUT_FACTOR, interval=10.0)
+
+
+FINGERPRINT_COMMANDS = ['docker ps -q --no-trunc', 'netstat -ntl']
+
+
+def host_fingerprint(channel):
+    """ Digest of the IDs of the running containers and of the listening
+    TCP sockets of the host. A restarted container or service changes the
+    fingerprint.
+    """
+    (containers, _), (sockets, _) = channel.run_batch(FINGERPRINT_COMMANDS,
+                                                      sudo=True)
+    listen = ['%s:%d' % address
+              for address in command_parsers.listen_ports(sockets)]
+    digest = hashlib.sha1()
+    for item in sorted(line.strip() for line in containers) + sorted(listen):
+        digest.update(item + '\n')
+    return digest.hexdigest()
 
 
 def expect_listen_ports(channel, expected):
-    stdout, stderr = channel.run('netstat -ntl')
-
-    absent = expected
-
-    regexp = re.compile(r'(tcp\s+[0-9]+\s+[0-9]+\s+([0-9\.]+):([0-9]+)|'
-                        'tcp6\s+[0-9]+\s+[0-9]+\s+:::([0-9]+))\s+(.*)'
-                        '\s+LISTEN')
-    for line in stdout:
-        match = regexp.match(line)
-        if match:
-            if match.group(1).startswith('tcp6'):
-                port = match.group(4)
-            else:
-                port = match.group(3)
-            port = int(port)
-            if port in absent:
-                absent.pop(port)
+    """ Returns the entries of the expected dict (keyed by port) that have
+    no listening socket.
+    """
+    absent = dict(expected)
+    lines = channel.run_lines('netstat -ntl')
+    for _, port in command_parsers.listen_ports(lines):
+        absent.pop(port, None)
+        if not absent:
+            break
     return absent
 
 
 def expect_docker_running(channel, containerNames):
-    stdout, stderr = channel.run("docker ps --format='{{.ID}} {{.Names}}'",
-                                 sudo=True)
-    regexp = re.compile(r'([a-f0-9]+)\s([\w-]+)')
-    absent = containerNames
-
-    for line in stdout:
-        m = regexp.match(line)
-        if not m:
-            print "Unexpected output from ps command: %s" % line
-            continue
-        name = m.group(2)
-        if name in absent:
-            absent.remove(name)
-
-    return absent
+    """ Returns the containerNames that are not running. """
+    lines = channel.run_lines("docker ps --format='{{.ID}} {{.Names}}'",
+                              sudo=True)
+    absent = set(containerNames)
+    unparsed = []
+    for _, name in command_parsers.docker_containers(lines, unparsed):
+        absent.discard(name)
+        if not absent:
+            break
+    for line in unparsed:
+        print "Unexpected output from ps command: %s" % line
+    return [name for name in containerNames if name in absent]
 
 
 def contrail_services_status(channel):
@@ -134,74 +201,66 @@ def contrail_control_instance_status(channel):
     """
     Verify that the control-node is not stuck with a deleted routing-instance.
     """
-    stdout, stderr = channel.run(
-        'curl http://localhost:8083/Snh_ShowRoutingInstanceSummaryReq')
-    if len(stdout) == 0:
+    client = IntrospectClient(channel, CONTROL_NODE_PORT)
+    count = 0
+    try:
+        for instance in client.iter_items('ShowRoutingInstanceSummaryReq',
+                                          'ShowRoutingInstance'):
+            if instance.findtext('deleted') == 'true':
+                print 'instance %s deleted' % instance.findtext('name')
+                count += 1
+    except (ParseError, CommandTimeout) as ex:
         print 'Unable to get routing instance summary'
-        print '\n'.join(stderr)
+        print ex
         return False
 
-    root = xml.etree.ElementTree.fromstringlist(stdout)
-    count = 0
-    for instance in root.findall('.//ShowRoutingInstance'):
-        delete_tag = instance.find('deleted')
-        if delete_tag.text == 'true':
-            name = instance.find('name')
-            print 'instance %s deleted' % name.text
-            count += 1
-
     return count == 0
 
 
-def contrail_xmpp_sessions(channel):
+def contrail_xmpp_sessions(channel, expected=3, timeout=180):
     """
-    Wait for 180 secs for the sessions to come up.
+    Wait for 180 secs for the sessions to come up: at least one per vrouter
+    agent (expected).
     """
-    for _ in range(18):
-        stdout, stderr = channel.run(
+    stdout = []
+
+    def sessions_established():
+        del stdout[:]
+        lines, _ = channel.run(
             "netstat -nt | grep -E ':5269\s+.*ESTABLISHED'")
-        if len(stdout) == 3:
-            return True
-        time.sleep(10)
+        stdout.extend(lines)
+        return len(stdout) >= expected
+
+    if wait_until(sessions_established, timeout):
+        return True
 
     print 'XMPP sessions:'
     print '\n'.join(stdout)
     return False
 
 
-def openshift_system_services(channel):
+def openshift_system_services(channel, timeout=360):
     """
     Ensure that openshift is able to start the docker-registry and router pods.
     This requires the deployer pods to be able to communicate with the master.
     """
 
-    def patternInList(pattern, pods):
-        regexp = re.compile(pattern)
-        for pod in pods:
-            if regexp.match(pod):
-                return True
-        return False
+    expect = [re.compile(r'docker-registry-([0-9]+)-'),
+              re.compile(r'router-([0-9]+)-')]
+    absent = []
 
-    expect = [r'docker-registry-([0-9]+)-', r'router-([0-9]+)-']
+    def system_pods_running(items):
+        pods = [item.generate_name for item in items
+                if item.phase == 'Running' and item.generate_name]
 
-    for _ in range(36):
-        stdout, stderr = channel.run("oc get pods -o json")
-        data = json.loads('\n'.join(stdout))
+        del absent[:]
+        for regexp in expect:
+            if not any(regexp.match(pod) for pod in pods):
+                absent.append(regexp.pattern)
+        return len(absent) == 0
 
-        pods = []
-        for item in data['items']:
-            if item['status']['phase'] != 'Running':
-                continue
-            if 'generateName' in item['metadata']:
-                pods.append(item['metadata']['generateName'])
-
-        absent = []
-        for pattern in expect:
-            if not patternInList(pattern, pods):
-                absent.append(pattern)
-        if len(absent) == 0:
-            return True
-        time.sleep(10)
+    if watch_pods(channel, system_pods_running, timeout):
+        return True
 
     print 'system pods not running'
     print absent
@@ -228,84 +287,160 @@ def contrail_gateway_expect_svc_routes(channel, master, gatewayIP):
         print 'Expected at least 3 clusterIPs'
         return False
 
-    stdout, stderr = channel.run("vif --list")
-
-    re_section = re.compile(r'vif0\/([0-9]+)\s+OS:\s(\w+)')
-    re_vrf = re.compile(r'Vrf:([0-9]+)')
-
     vrf_index = None
-    inSection = False
-    for line in stdout:
-        m = re_section.match(line)
-        if m:
-            if m.group(2) == 'gateway1':
-                inSection = True
-                continue
-            if inSection:
-                break
-        if not inSection:
-            continue
-        tag = re_vrf.search(line)
-        if tag:
-            vrf_index = int(tag.group(1))
+    for _, name, vrf in command_parsers.vif_interfaces(
+            channel.run_lines('vif --list')):
+        if name == 'gateway1':
+            vrf_index = vrf
+            break
 
     if not vrf_index:
         print 'Unable to determine vrf id'
         return False
 
-    absent = svc
-    stdout, stderr = channel.run(
-        "curl http://localhost:8085/Snh_Inet4UcRouteReq?uc_index=%d" %
-        vrf_index)
-    root = xml.etree.ElementTree.fromstringlist(stdout)
-    for route in root.findall('.//RouteUcSandeshData'):
-        ip = route.find('src_ip')
-        prefixlen = route.find('src_plen')
-        if prefixlen.text == "32" and ip.text in svc:
-            absent.remove(ip.text)
+    absent = set(svc)
+    client = IntrospectClient(channel, VROUTER_AGENT_PORT)
+    try:
+        for route in client.iter_items('Inet4UcRouteReq',
+                                       'RouteUcSandeshData',
+                                       uc_index=vrf_index):
+            if route.findtext('src_plen') == '32':
+                absent.discard(route.findtext('src_ip'))
+            if not absent:
+                break
+    except (ParseError, CommandTimeout) as ex:
+        print 'Unable to get the gateway VRF routes'
+        print ex
+        return False
 
     if len(absent) > 1:
         print 'services not in gateway VRF'
-        print absent
+        print sorted(absent)
         return False
     return True
 
 
-def contrail_svc_address_ping(prober, master):
-    """
-    Ensure that the specified system can reach the service IP addresses.
-    """
+PING_COUNT = 5
 
+PROBE_CMD = (
+    "if command -v fping >/dev/null 2>&1; then"
+    " fping -q -c %(count)d %(addresses)s 2>&1;"
+    " else for ip in %(addresses)s; do echo $ip; done |"
+    " xargs -P %(parallel)d -I{} sh -c"
+    " 'ping -q -c %(count)d {} 2>&1 | sed \"s/^/{} /\"'; fi")
+
+
+def service_addresses(master):
+    """ Service clusterIPs, excluding the API server service (x.x.0.1).
+
+    Returns None if the service list cannot be retrieved.
+    """
     stdout, stderr = master.run(
         "oc get svc -o jsonpath='{.items[*].spec.clusterIP}'")
     if len(stdout) == 0:
         print 'No service IPs'
         print '\n'.join(stderr)
+        return None
+    return [svc for svc in stdout[0].split() if not svc.endswith('.0.1')]
+
+
+def probe_addresses(prober, addresses, count=PING_COUNT, parallel=64):
+    """ Ping all the addresses concurrently from the prober host.
+
+    Uses a single remote command: fping when it is installed, otherwise
+    up to 'parallel' concurrent ping processes. Returns a dict keyed by
+    address with the number of packets 'transmitted' and 'received', the
+    'loss' percentage and 'rtt' as a (min, avg, max) tuple in ms (None when
+    no reply was received).
+    """
+    results = {}
+    for address in addresses:
+        results[address] = {
+            'transmitted': count, 'received': 0, 'loss': 100, 'rtt': None
+        }
+    if not addresses:
+        return results
+
+    stdout, stderr = prober.run(PROBE_CMD % {
+        'count': count,
+        'addresses': ' '.join(addresses),
+        'parallel': parallel
+    })
+    for address, stats in command_parsers.ping_statistics(stdout):
+        results.setdefault(address, {}).update(stats)
+
+    for entry in results.values():
+        if entry.get('transmitted'):
+            entry['loss'] = (100 * (entry['transmitted'] - entry['received']) /
+                             entry['transmitted'])
+    return results
+
+
+def contrail_svc_address_ping(prober, master):
+    """
+    Ensure that the specified system can reach the service IP addresses.
+    """
+    serviceIPs = service_addresses(master)
+    if serviceIPs is None:
         return False
-    serviceIPs = stdout[0].split()
-    for svc in serviceIPs:
-        if svc.endswith('.0.1'):
-            serviceIPs.remove(svc)
-            break
 
     success = True
-    regexp = re.compile(r'(\d+) packets transmitted, (\d+) received')
+    results = probe_addresses(prober, serviceIPs)
     for svc in serviceIPs:
-        result = 0
-        stdout, stderr = prober.run("ping -c 5 %s" % svc)
-        for line in stdout:
-            m = regexp.match(line)
-            if m:
-                result = int(m.group(2))
-                break
-        if result != 5:
-            print "ping %s" % svc
-            print line
+        if results[svc]['received'] != PING_COUNT:
+            print "ping %s: %d/%d received" % (
+                svc, results[svc]['received'], results[svc]['transmitted'])
             success = False
+
     return success
 
 
-def test_application_status(master, gateway):
+def contrail_svc_reachability_matrix(hosts, pool, master, workers):
+    """
+    Probe the service IP addresses from each of the hosts in parallel.
+
+    Prints one row per host with the number of reachable services, the
+    average rtt and the unreachable addresses. Returns a dict keyed by host
+    with the probe_addresses results.
+    """
+    serviceIPs = service_addresses(master)
+    if serviceIPs is None:
+        return {}
+
+    def probe(host):
+        try:
+            return host, probe_addresses(pool.get(host), serviceIPs)
+        except Exception as ex:
+            print '%s: %s' % (host, ex)
+            return host, None
+
+    workers = max(1, min(workers, len(hosts)))
+    thread_pool = ThreadPool(workers)
+    try:
+        matrix = dict(thread_pool.map(probe, hosts))
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+    print 'Service reachability (%d services):' % len(serviceIPs)
+    for host in hosts:
+        results = matrix[host]
+        if results is None:
+            print '  %-20s unable to probe' % host
+            continue
+        reachable = [ip for ip in serviceIPs
+                     if results[ip]['received'] == results[ip]['transmitted']]
+        rtts = [results[ip]['rtt'][1] for ip in serviceIPs
+                if results[ip]['rtt']]
+        avg = sum(rtts) / len(rtts) if rtts else 0.0
+        unreachable = sorted(set(serviceIPs) - set(reachable))
+        print '  %-20s %d/%d  avg %.3f ms  %s' % (
+            host, len(reachable), len(serviceIPs), avg,
+            ' '.join(unreachable))
+    return matrix
+
+
+def test_application_status(master, gateway, timeout=3600):
     """ Returns True if the application is running
 
     Deployment fails is any of the pods is in Error state.
@@ -313,67 +448,173 @@ def test_application_status(master, gateway):
     The test succeeds if the web-front end is reachable.
     Deployment takes 5/10 mins to complete.
     """
-    start = datetime.now()
-    while (datetime.now() - start).seconds < (60 * 60):
-        stdout, stderr = master.run(
-            "oc --namespace=test get pods -o json")
-        try:
-            podInfo = json.loads('\n'.join(stdout))
-        except Exception as ex:
-            print 'Unable to decode pod information %s' % ex
-            print stderr
-            return False
 
+    def deployment_done(items):
         run_count = 0
         pending = 0
         builder = 0
-        for item in podInfo['items']:
-            if item['status']['phase'] == 'Failed':
-                print 'pod %s Failed' % item['metadata']['name']
-                return False
-            elif item['status']['phase'] == 'Running':
-                if (item['metadata']['name'].endswith('-build') or
-                   item['metadata']['name'].endswith('-deploy')):
+        for item in items:
+            if item.phase == 'Failed':
+                print 'pod %s Failed' % item.name
+                return 'failed'
+            elif item.phase == 'Running':
+                if (item.name.endswith('-build') or
+                   item.name.endswith('-deploy')):
                     builder += 1
                     continue
                 run_count += 1
-            elif item['status']['phase'] == 'Pending':
+            elif item.phase == 'Pending':
                 pending += 1
 
         if not pending and not builder and run_count >= 2:
-            break
-        time.sleep(180)
+            return 'running'
+        return None
 
-    for _ in range(6):
+    status = watch_pods(master, deployment_done, timeout, namespace='test')
+    if status == 'failed':
+        return False
+
+    output = {}
+    pattern = re.compile(r'Listing articles')
+
+    def application_reachable():
         stdout, stderr = gateway.run(
             "no_proxy=* curl http://%s:%d/articles" %
             ('rails-postgresql-example-test.router.default.svc.cluster.local',
              80))
-        pattern = re.compile(r'Listing articles')
+        output['stdout'], output['stderr'] = stdout, stderr
         for line in stdout:
             if pattern.search(line):
-                print "Application OK"
                 return True
-        time.sleep(10)
+        return False
+
+    if wait_until(application_reachable, 60):
+        print "Application OK"
+        return True
 
     print 'Application stdout:'
-    print '\n'.join(stdout)
+    print '\n'.join(output['stdout'])
     print 'Application stderr:'
-    print '\n'.join(stderr)
+    print '\n'.join(output['stderr'])
     return False
 
 
+def contrail_agent_sweep(hosts, pool, workers, timeout=180):
+    """
+    Query the introspect of the vrouter agent of each host. Fails when an
+    agent still cannot be queried or has no established XMPP session after
+    timeout secs; only those hosts are queried again. Inactive interfaces
+    and the hosts whose counters deviate from the fleet are reported.
+    """
+    summaries = {}
+    pending = list(hosts)
+
+    def agents_ready():
+        summaries.update(agent_sweep.sweep_agents(pending, pool, workers))
+        pending[:] = [host for host in pending
+                      if agent_sweep.agent_failures(summaries[host])]
+        return not pending
+
+    ready = wait_until(agents_ready, timeout)
+    outliers = agent_sweep.find_outliers(summaries)
+    agent_sweep.print_sweep(hosts, summaries, outliers)
+    return ready
+
+
+def node_agent_status(node, pool, report):
+    """ Per-host check for the nodes group. """
+    channel = pool.get(node)
+    return report.run_cached('contrail_docker_agent', node,
+                             functools.partial(host_fingerprint, channel),
+                             contrail_docker_agent, channel, node)
+
+
+def gateway_agent_status(gateway, pool, report, master, stage):
+    """ Per-host check for the gateways group. """
+    channel = pool.get(gateway)
+    ok = report.run_cached('contrail_docker_agent', gateway,
+                           functools.partial(host_fingerprint, channel),
+                           contrail_docker_agent, channel, gateway)
+    if stage >= 4:
+        if not report.run('contrail_gateway_expect_svc_routes', gateway,
+                          contrail_gateway_expect_svc_routes,
+                          channel, master, gateway):
+            ok = False
+    return ok
+
+
+def check_hosts(hosts, checks, workers):
+    """ Run the per-group check for each (group, host) pair with at most
+    'workers' hosts in flight.
+
+    Returns a list of (group, host, ok) tuples in the same order as hosts.
+    A host whose check raises (e.g. ssh connection failure) is reported as
+    failed rather than aborting the whole validation run.
+    """
+
+    def run_check(item):
+        group, host = item
+        try:
+            return group, host, bool(checks[group](host))
+        except Exception as ex:
+            print '%s: %s' % (host, ex)
+            return group, host, False
+
+    if workers <= 1 or len(hosts) <= 1:
+        return map(run_check, hosts)
+
+    pool = ThreadPool(min(workers, len(hosts)))
+    try:
+        return pool.map(run_check, hosts)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def print_host_report(results):
+    """ Summary of the per-host results; one line per host. """
+    failed = [host for _, host, ok in results if not ok]
+    print 'Host status (%d hosts, %d failed):' % (len(results), len(failed))
+    for group, host, ok in results:
+        print '  %-10s %-20s %s' % (group, host, 'OK' if ok else 'FAIL')
+
+
+def dynamic_inventory(filename):
+    """ Output of an ansible dynamic inventory script (e.g. ec2_inventory.py)
+    as a dict of (host, ansible_ssh_host) lists keyed by group.
+    """
+    data = json.loads(subprocess.check_output([filename, '--list']))
+    hostvars = data.get('_meta', {}).get('hostvars', {})
+    groups = {}
+    for group, entry in data.items():
+        if group == '_meta':
+            continue
+        hosts = entry.get('hosts', []) if isinstance(entry, dict) else entry
+        groups[group] = [(host, hostvars.get(host, {}).get(
+            'ansible_ssh_host', host)) for host in hosts]
+    return groups
+
+
 def inventory_parse(filename):
     """ Parse the inventory file.
 
     Expects inventory to have the following format:
     [section]
     hostname ansible_ssh_host=<IP>
+
+    An executable inventory is run as an ansible dynamic inventory script.
     """
 
     group_names = ['masters', 'gateways', 'nodes']
     groups = {}
 
+    if os.path.isfile(filename) and os.access(filename, os.X_OK):
+        hosts = dynamic_inventory(filename)
+        for section in group_names:
+            if section in hosts:
+                groups[section] = [address for _, address in hosts[section]]
+        return groups
+
     config = ConfigParser.ConfigParser(allow_no_value=True)
     with open(filename, 'r') as fp:
         config.readfp(fp)
@@ -390,6 +631,77 @@ def inventory_parse(filename):
     return groups
 
 
+def validate_cluster(args, groups, pool, report):
+    """ Run the checks of the stage; returns True if they all pass. """
+    masterIP = groups['masters'][0]
+    master = pool.get(masterIP)
+    master.prefetch(['curl http://localhost:8082', 'netstat -ntl'])
+    fingerprint = functools.partial(host_fingerprint, master)
+
+    success = (
+        report.run_cached('contrail_api_status', masterIP, fingerprint,
+                          contrail_api_status, master) and
+        report.run_cached('contrail_docker_status', masterIP, fingerprint,
+                          contrail_docker_status, master,
+                          netManager=args.stage >= 2) and
+        report.run_cached('contrail_services_status', masterIP, fingerprint,
+                          contrail_services_status, master) and
+        (args.stage < 3 or
+         report.run('contrail_xmpp_sessions', masterIP,
+                    contrail_xmpp_sessions, master,
+                    expected=len(groups.get('gateways', []) +
+                                 groups.get('nodes', [])))) and
+        (args.stage < 4 or
+         report.run('openshift_system_services', masterIP,
+                    openshift_system_services, master)) and
+        (args.stage < 4 or
+         report.run('contrail_control_instance_status', masterIP,
+                    contrail_control_instance_status, master))
+    )
+
+    checks = {
+        'nodes': functools.partial(node_agent_status, pool=pool,
+                                   report=report),
+        'gateways': functools.partial(gateway_agent_status, pool=pool,
+                                      report=report, master=master,
+                                      stage=args.stage),
+    }
+    hosts = [(group, host) for group in ['nodes', 'gateways']
+             for host in groups.get(group, [])]
+    results = check_hosts(hosts, checks, args.workers)
+
+    print_host_report(results)
+    if not all(ok for _, _, ok in results):
+        success = False
+
+    if args.stage >= 3 and args.agent_sweep:
+        agents = groups.get('gateways', []) + groups.get('nodes', [])
+        if not report.run('contrail_agent_sweep', None,
+                          contrail_agent_sweep, agents, pool,
+                          args.sweep_workers):
+            success = False
+
+    if args.stage >= 4 and not report.run('contrail_svc_address_ping',
+                                          masterIP, contrail_svc_address_ping,
+                                          master, master):
+        success = False
+
+    if args.stage >= 4 and args.probe_matrix:
+        # Informational: pass/fail is determined by the master probe above.
+        contrail_svc_reachability_matrix(
+            groups['masters'][:1] + groups.get('gateways', []) +
+            groups.get('nodes', []), pool, master, args.workers)
+
+    if args.stage >= 5:
+        gatewayIP = groups['gateways'][0]
+        if not report.run('test_application_status', gatewayIP,
+                          test_application_status, master,
+                          pool.get(gatewayIP)):
+            success = False
+
+    return success
+
+
 def main():
     """
     stages:
@@ -407,51 +719,67 @@ def main():
     parser = argparse.ArgumentParser()
 
     parser.add_argument('--stage', type=int, help='Install stage')
-    parser.add_argument('inventory')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Number of hosts to check concurrently')
+    parser.add_argument('--probe-matrix', action='store_true',
+                        help='Probe the service addresses from every host')
+    parser.add_argument('--agent-sweep', action='store_true',
+                        help='Query the introspect of every vrouter agent')
+    parser.add_argument('--sweep-workers', type=int, default=64,
+                        help='Number of agents queried concurrently')
+    parser.add_argument('--timeout-factor', type=float, default=1.0,
+                        help='Scale the deadline of the readiness waits')
+    parser.add_argument('--report', help='Write the check results to file')
+    parser.add_argument('--report-format', default='jsonl',
+                        choices=ValidationReport.FORMATS,
+                        help='Format of the --report file')
+    parser.add_argument('--simulate', type=int, metavar='NODES',
+                        help='Validate a simulated cluster of NODES nodes '
+                        'instead of the inventory hosts')
+    parser.add_argument('--simulate-latency', type=float, default=0.0,
+                        help='Latency (seconds) of each simulated command')
+    parser.add_argument('--replay',
+                        help='Replay the command output recorded in a JSON '
+                        'file instead of connecting to the hosts')
+    parser.add_argument('--cache',
+                        help='Skip the checks that passed in a previous run '
+                        'on hosts that did not change since (results file)')
+    parser.add_argument('--cache-max-age', type=int, default=3600,
+                        help='Maximum age (seconds) of the cached results')
+    parser.add_argument('inventory', nargs='?')
 
     args = parser.parse_args()
-    groups = inventory_parse(args.inventory)
+
+    global TIMEOUT_FACTOR
+    TIMEOUT_FACTOR = args.timeout_factor
+
+    if args.simulate:
+        simulator = ClusterSimulator(args.simulate,
+                                     latency=args.simulate_latency)
+        groups = simulator.inventory()
+        pool = ExecutorPool(factory=simulator.executor)
+    elif args.inventory:
+        groups = inventory_parse(args.inventory)
+        if args.replay:
+            pool = ExecutorPool(factory=load_replay(args.replay))
+        else:
+            pool = ExecutorPool()
+    else:
+        parser.error('an inventory is required')
 
     if 'masters' not in groups:
         print '%s does not define a master' % args.inventory
         sys.exit(1)
 
-    master = Executor(groups['masters'][0])
-
-    success = (
-        contrail_api_status(master) and
-        contrail_docker_status(master, netManager=args.stage >= 2) and
-        contrail_services_status(master) and
-        (args.stage < 3 or contrail_xmpp_sessions(master)) and
-        (args.stage < 4 or openshift_system_services(master)) and
-        (args.stage < 4 or contrail_control_instance_status(master))
-    )
-
-    for node in groups['nodes']:
-        with Executor(node) as channel:
-            ok = contrail_docker_agent(channel, node)
-            if not ok:
-                success = False
-
-    for gateway in groups['gateways']:
-        with Executor(gateway) as channel:
-            ok = contrail_docker_agent(channel, gateway)
-            if (args.stage >= 4):
-                if not contrail_gateway_expect_svc_routes(channel, master,
-                                                          gateway):
-                    ok = False
-            if not ok:
-                success = False
-
-    if args.stage >= 4 and not contrail_svc_address_ping(master, master):
-        success = False
-
-    if args.stage >= 5:
-        with Executor(groups['gateways'][0]) as channel:
-            if not test_application_status(master, channel):
-                success = False
-
-    del master
+    cache = None
+    if args.cache:
+        cache = ValidationCache(args.cache, max_age=args.cache_max_age)
+    with pool, ValidationReport(args.stage, cache=cache) as report:
+        success = validate_cluster(args, groups, pool, report)
+    if cache is not None:
+        cache.save()
+    if args.report:
+        report.write(args.report, args.report_format)
 
     if not success:
         print 'FAIL'
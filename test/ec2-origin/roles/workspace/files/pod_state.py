@@ -0,0 +1,97 @@
+"""
+Compact, incremental view of the pods of a namespace.
+
+The pods are read with a go template that prints one line per pod with only
+the fields used by the checks (name, generateName, phase, resourceVersion,
+deletionTimestamp) instead of the full JSON objects. PodView keeps the
+state of the pods between reads and reports whether a read changed it, so
+that the checks only re-evaluate the pods when something changed.
+"""
+
+import collections
+import pipes
+
+PodState = collections.namedtuple(
+    'PodState', ['name', 'generate_name', 'phase', 'resource_version',
+                 'deleted'])
+
+# Printed by the go template for the fields that are not set.
+_NO_VALUE = '<no value>'
+
+POD_TEMPLATE = ('{{.metadata.name}}{{"\\t"}}{{.metadata.generateName}}'
+                '{{"\\t"}}{{.status.phase}}{{"\\t"}}'
+                '{{.metadata.resourceVersion}}{{"\\t"}}'
+                '{{.metadata.deletionTimestamp}}{{"\\n"}}')
+
+
+def pod_command(namespace=None, watch=False):
+    """ oc command that prints one line per pod (per change with watch) """
+    if watch:
+        template = POD_TEMPLATE
+        cmd = 'oc get pods --watch'
+    else:
+        template = '{{range .items}}%s{{end}}' % POD_TEMPLATE
+        cmd = 'oc get pods'
+    cmd += ' -o template --template=%s' % pipes.quote(template)
+    if namespace:
+        cmd += ' --namespace=%s' % namespace
+    return cmd
+
+
+def parse_pod_lines(lines):
+    """ Generator over the PodState of the lines printed by pod_command.
+    Lines that do not have the expected fields (e.g. errors) are skipped.
+    """
+    for line in lines:
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) != 5:
+            continue
+        name, generate_name, phase, version, deleted = fields
+        if generate_name == _NO_VALUE:
+            generate_name = None
+        yield PodState(name, generate_name, phase, version,
+                       deleted not in ('', _NO_VALUE))
+
+
+class PodView(object):
+    """ Pods keyed by name. """
+
+    def __init__(self):
+        self._pods = {}
+
+    def update(self, states):
+        """ Apply the changes in states (e.g. watch events). Returns True if
+        a pod was added, modified or deleted.
+        """
+        changed = False
+        for state in states:
+            current = self._pods.get(state.name)
+            if state.deleted:
+                if current is not None:
+                    del self._pods[state.name]
+                    changed = True
+            elif current is None or \
+                    current.resource_version != state.resource_version:
+                self._pods[state.name] = state
+                changed = True
+        return changed
+
+    def replace(self, states):
+        """ Update the view with a complete listing; the pods that are not
+        listed are removed. Returns True if the view changed.
+        """
+        listed = set()
+
+        def record(states):
+            for state in states:
+                listed.add(state.name)
+                yield state
+
+        changed = self.update(record(states))
+        for name in set(self._pods) - listed:
+            del self._pods[name]
+            changed = True
+        return changed
+
+    def pods(self):
+        return self._pods.values()
@@ -0,0 +1,167 @@
+"""
+Client for the Sandesh introspect (HTTP/XML) interface of the contrail
+control-node (port 8083) and vrouter agent (port 8085).
+
+Responses are parsed incrementally as they are received: each matching
+element is handed to the caller and then discarded, so that large route
+tables are processed with bounded memory. Paginated responses are followed
+through their next_batch / next_page links. count_matches() counts
+patterns in the raw response, without building the elements, for the
+tables that are only counted.
+"""
+
+import pipes
+import re
+import urllib
+from xml.sax.saxutils import unescape
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+ParseError = ElementTree.ParseError
+
+CONTROL_NODE_PORT = 8083
+VROUTER_AGENT_PORT = 8085
+
+# Elements that carry the link to the next page of a response.
+_PAGINATION_TAGS = ('next_batch', 'next_page')
+
+_re_pagination = re.compile(r'<(?:next_batch|next_page)\b([^>]*)>([^<]*)<')
+_re_attribute = re.compile(r'(\w+)="([^"]*)"')
+
+# Longest match expected by count_matches (including the pagination tags).
+_MATCH_WINDOW = 4096
+
+
+class _StreamReader(object):
+    """ File-like object over a generator of data chunks. """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._chunks.close()
+
+
+class IntrospectClient(object):
+    """ Introspect requests executed via curl on the remote host. """
+
+    def __init__(self, channel, port, timeout=60):
+        self._channel = channel
+        self._port = port
+        self._timeout = timeout
+
+    def _url(self, request, params):
+        url = 'http://localhost:%d/Snh_%s' % (self._port, request)
+        if params:
+            url += '?' + urllib.urlencode(sorted(params.items()))
+        return url
+
+    def iter_items(self, request, tag, **params):
+        """ Generator over the <tag> elements of the response to request.
+
+        Each element is complete when yielded and is cleared as soon as the
+        caller asks for the next one. Raises ParseError if the response is
+        not valid XML (e.g. the introspect port is not listening).
+        """
+        url = self._url(request, params)
+        while url:
+            next_url = None
+            for elem in self._iterparse(url, tag):
+                if elem.tag in _PAGINATION_TAGS:
+                    next_url = self._pagination_url(elem)
+                else:
+                    yield elem
+            url = next_url
+
+    def count_matches(self, request, patterns, **params):
+        """ Returns the number of matches of each of the regexps in the
+        response to request, following the pagination links.
+
+        The response is scanned as it is received and is not parsed: an
+        empty or invalid response yields zero counts.
+        """
+        regexps = [re.compile(pattern) for pattern in patterns]
+        counts = [0] * len(regexps)
+        url = self._url(request, params)
+        while url:
+            chunks = self._channel.stream('curl -s %s' % pipes.quote(url),
+                                          self._timeout)
+            url = None
+            buf = ''
+            try:
+                for data in chunks:
+                    buf += data
+                    # Matches that start in the last window are counted
+                    # with the next chunk.
+                    cutoff = len(buf) - _MATCH_WINDOW
+                    if cutoff > 0:
+                        url = self._scan(buf, cutoff, regexps, counts) or url
+                        buf = buf[cutoff:]
+            finally:
+                chunks.close()
+            url = self._scan(buf, len(buf), regexps, counts) or url
+        return counts
+
+    def _scan(self, buf, cutoff, regexps, counts):
+        """ Count the matches that start before cutoff; returns the URL of
+        the next page if the link is found.
+        """
+        for i, regexp in enumerate(regexps):
+            for match in regexp.finditer(buf):
+                if match.start() >= cutoff:
+                    break
+                counts[i] += 1
+        next_url = None
+        for match in _re_pagination.finditer(buf):
+            if match.start() >= cutoff:
+                break
+            attributes = dict(_re_attribute.findall(match.group(1)))
+            link = attributes.get('link')
+            text = unescape(attributes.get('text') or match.group(2).strip(),
+                            {'&quot;': '"'})
+            if link and text:
+                next_url = self._url(link, {'x': text})
+        return next_url
+
+    def _pagination_url(self, elem):
+        link = elem.get('link')
+        text = elem.get('text') or elem.text
+        if not link or not text:
+            return None
+        return self._url(link, {'x': text})
+
+    def _iterparse(self, url, tag):
+        stream = _StreamReader(self._channel.stream(
+            'curl -s %s' % pipes.quote(url), self._timeout))
+        parents = []
+        try:
+            for event, elem in ElementTree.iterparse(
+                    stream, events=('start', 'end')):
+                if event == 'start':
+                    parents.append(elem)
+                    continue
+                parents.pop()
+                if elem.tag != tag and elem.tag not in _PAGINATION_TAGS:
+                    continue
+                yield elem
+                # Discard the element once it has been processed.
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+        finally:
+            stream.close()
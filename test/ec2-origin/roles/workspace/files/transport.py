@@ -0,0 +1,213 @@
+"""
+Command transports used by opencontrail_validate to reach the cluster
+hosts.
+"""
+
+import pipes
+import socket
+import threading
+import time
+
+from command_parsers import iter_lines
+
+
+class CommandTimeout(Exception):
+    """ The output of a streamed command did not end before the timeout:
+    the lines received so far are incomplete.
+    """
+    pass
+
+
+class BaseExecutor(object):
+    """ Command transport to a cluster host.
+
+    Subclasses implement _exec_command(), stream() and close(); the
+    checks only use run(), run_batch(), prefetch() and stream().
+    """
+    BATCH_MARKER = '--- opencontrail_validate batch ---'
+
+    def __init__(self):
+        self._prefetched = {}
+
+    def _exec_command(self, cmd, sudo):
+        """ Returns the (stdout, stderr) lines of cmd. """
+        raise NotImplementedError()
+
+    def stream(self, cmd, timeout, sudo=False):
+        """ Generator over the stdout of a long running command (e.g. a
+        watch). The command is terminated when the generator is closed or
+        once timeout seconds have elapsed; in the latter case CommandTimeout
+        is raised after the data received so far.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def run(self, cmd, sudo=False):
+        result = self._prefetched.pop((cmd, sudo), None)
+        if result is not None:
+            return result
+        return self._exec_command(cmd, sudo)
+
+    def run_lines(self, cmd, sudo=False, timeout=120):
+        """ Generator over the stdout lines of cmd, read as they are
+        received. The prefetched output is used when available. Raises
+        CommandTimeout if cmd does not complete within timeout.
+        """
+        result = self._prefetched.pop((cmd, sudo), None)
+        if result is not None:
+            return iter(result[0])
+        return iter_lines(self.stream(cmd, timeout, sudo=sudo))
+
+    def run_batch(self, commands, sudo=False):
+        """ Run several commands as a single command.
+
+        Each command is followed by a marker so that the output can be
+        split back per command. Returns a list of (stdout, stderr) tuples,
+        one per command.
+        """
+        stdout, stderr = self._exec_command(
+            BaseExecutor._batch_script(commands, sudo), sudo)
+        return BaseExecutor._batch_results(stdout, stderr, len(commands), sudo)
+
+    @staticmethod
+    def _batch_script(commands, sudo):
+        # With sudo the command runs on a pty, which merges stderr into
+        # stdout: the marker is only echoed once, on stdout, and the stderr
+        # of each command is returned as part of its stdout.
+        marker = 'echo; echo %s' % BaseExecutor.BATCH_MARKER
+        if not sudo:
+            marker += '; echo %s >&2' % BaseExecutor.BATCH_MARKER
+        script = '\n'.join('%s; %s' % (cmd, marker) for cmd in commands)
+        if sudo:
+            script = 'sh -c %s' % pipes.quote(script)
+        return script
+
+    @staticmethod
+    def _batch_results(stdout, stderr, count, sudo):
+        out = BaseExecutor._split_batch(stdout, count)
+        if sudo:
+            err = [[] for _ in range(count)]
+        else:
+            err = BaseExecutor._split_batch(stderr, count)
+        for segment in out:
+            # drop the newline echoed in front of the marker.
+            if segment and segment[-1].strip() == '':
+                segment.pop()
+        return zip(out, err)
+
+    def prefetch(self, commands, sudo=False):
+        """ Batch the commands now; the next run() of each one returns the
+        stored result instead of executing the command again.
+        """
+        for cmd, result in zip(commands, self.run_batch(commands, sudo=sudo)):
+            self._prefetched[(cmd, sudo)] = result
+
+    @staticmethod
+    def _split_batch(lines, count):
+        segments = [[]]
+        for line in lines:
+            if line.strip() == BaseExecutor.BATCH_MARKER:
+                segments.append([])
+                continue
+            segments[-1].append(line)
+        segments.extend([] for _ in range(count + 1 - len(segments)))
+        return segments[:count]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class Executor(BaseExecutor):
+    """ Executes the commands over ssh. """
+    DEFAULT_USERNAME = 'centos'
+
+    def __init__(self, server, username=DEFAULT_USERNAME):
+        """ Constructor """
+        # paramiko is only required to reach the hosts: the simulated and
+        # replayed runs do not use this class.
+        import paramiko
+        super(Executor, self).__init__()
+        self._ssh_client = paramiko.SSHClient()
+        self._ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self._ssh_client.connect(server, username=username)
+
+    def _exec_command(self, cmd, sudo):
+        if sudo:
+            cmd = 'sudo ' + cmd
+        _, stdout, stderr = self._ssh_client.exec_command(cmd, get_pty=sudo)
+        stdout.channel.recv_exit_status()
+        return stdout.readlines(), stderr.readlines()
+
+    def stream(self, cmd, timeout, sudo=False):
+        deadline = time.time() + timeout
+        chan = self._ssh_client.get_transport().open_session()
+        try:
+            chan.settimeout(1.0)
+            if sudo:
+                cmd = 'sudo ' + cmd
+                chan.get_pty()
+            chan.exec_command(cmd)
+            while time.time() < deadline:
+                try:
+                    data = chan.recv(32768)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                yield data
+            else:
+                raise CommandTimeout('%s: no end of output after %ds'
+                                     % (cmd, timeout))
+        finally:
+            chan.close()
+
+    def close(self):
+        self._ssh_client.close()
+
+    def __del__(self):
+        """ Destructor """
+        if hasattr(self, '_ssh_client'):
+            self._ssh_client.close()
+
+
+class ExecutorPool(object):
+    """ Executors keyed by host.
+
+    A single ssh connection per host is reused by all the checks, including
+    checks running on different threads: paramiko multiplexes the channels
+    over the shared transport. factory(host) creates the executor of a host
+    (e.g. cluster_simulator.ClusterSimulator.executor for offline runs).
+    """
+
+    def __init__(self, factory=Executor):
+        self._factory = factory
+        self._executors = {}
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+        # Connect holding only the per-host lock so that handshakes to
+        # different hosts proceed in parallel.
+        with host_lock:
+            if host not in self._executors:
+                self._executors[host] = self._factory(host)
+            return self._executors[host]
+
+    def close(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.close()
+            self._executors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
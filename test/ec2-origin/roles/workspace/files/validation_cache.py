@@ -0,0 +1,82 @@
+"""
+Persisted results of the opencontrail_validate checks.
+
+A check that passed is recorded together with the fingerprint of its host
+(running containers, listening ports). A later run, typically the next
+--stage, skips the check while the fingerprint of the host is unchanged and
+re-runs it as soon as the host changed.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ValidationCache(object):
+    """ Check results keyed by host, check name and check parameters. """
+
+    def __init__(self, filename, max_age=None):
+        """ Entries older than max_age seconds are ignored (no limit when
+        max_age is None or 0).
+        """
+        self._filename = filename
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._host_locks = {}
+        self._fingerprints = {}
+        try:
+            with open(filename, 'r') as fp:
+                self._entries = json.load(fp)
+        except (IOError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(host, check, params):
+        return '%s %s %s' % (host, check, json.dumps(params, sort_keys=True))
+
+    def fingerprint(self, host, compute):
+        """ Fingerprint of the host; compute() is called once per host. """
+        with self._lock:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host not in self._fingerprints:
+                self._fingerprints[host] = compute()
+            return self._fingerprints[host]
+
+    def lookup(self, host, check, params, fingerprint):
+        """ Returns the entry of the check if it passed on the host with the
+        same fingerprint and parameters, None otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(host, check, params))
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return None
+        if self._max_age and time.time() - entry['passed'] > self._max_age:
+            return None
+        return entry
+
+    def store(self, host, check, params, fingerprint, stage):
+        with self._lock:
+            self._entries[self._key(host, check, params)] = {
+                'host': host,
+                'check': check,
+                'fingerprint': fingerprint,
+                'passed': time.time(),
+                'stage': stage,
+            }
+
+    def discard(self, host, check, params):
+        with self._lock:
+            self._entries.pop(self._key(host, check, params), None)
+
+    def save(self):
+        """ Replace the cache file atomically. """
+        with self._lock:
+            data = json.dumps(self._entries, indent=1, sort_keys=True)
+        dirname = os.path.dirname(os.path.abspath(self._filename))
+        fd, tmpname = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(data)
+        os.rename(tmpname, self._filename)
@@ -0,0 +1,179 @@
+"""
+Structured results for the opencontrail_validate checks.
+
+Each check run through ValidationReport.run() produces a record with the
+check name, host, stage, duration, number of attempts and the output the
+check printed. The records can be written as JSON lines or as JUnit XML so
+that jenkins can trend the duration of each check across builds. Checks run
+through run_cached() are skipped when a ValidationCache shows that they
+already passed on an unchanged host.
+"""
+
+import json
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+_local = threading.local()
+
+
+class _OutputCapture(object):
+    """ sys.stdout replacement that copies the output written by a thread
+    into the record of the check that the thread is running.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, data):
+        self._stream.write(data)
+        record = getattr(_local, 'record', None)
+        if record is not None:
+            record['output'].append(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def count_attempt():
+    """ Called by the wait loops on each attempt of the current check. """
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['attempts'] += 1
+
+
+class ValidationReport(object):
+    FORMATS = ['jsonl', 'junit']
+
+    def __init__(self, stage, cache=None):
+        self._stage = stage
+        self._cache = cache
+        self._records = []
+        self._lock = threading.Lock()
+        self._stdout = sys.stdout
+        sys.stdout = _OutputCapture(sys.stdout)
+
+    def run(self, name, host, check, *args, **kwargs):
+        """ Run check(*args, **kwargs) and record the result.
+
+        Returns the value returned by the check. An exception raised by the
+        check is recorded as a failure and re-raised.
+        """
+        record = {
+            'check': name,
+            'host': host,
+            'stage': self._stage,
+            'start': time.time(),
+            'attempts': 0,
+            'cached': False,
+            'output': [],
+        }
+        previous = getattr(_local, 'record', None)
+        _local.record = record
+        try:
+            result = check(*args, **kwargs)
+        except Exception as ex:
+            record['error'] = '%s: %s' % (type(ex).__name__, ex)
+            result = False
+            raise
+        finally:
+            _local.record = previous
+            record['duration'] = time.time() - record['start']
+            record['attempts'] = max(record['attempts'], 1)
+            record['ok'] = bool(result)
+            record['output'] = ''.join(record['output'])
+            with self._lock:
+                self._records.append(record)
+        return result
+
+    def run_cached(self, name, host, fingerprint, check, *args, **kwargs):
+        """ Like run(), but when the report has a cache the check is skipped
+        if it passed before on the host with the same fingerprint and the
+        same keyword arguments.
+
+        fingerprint() returns the fingerprint of the host; it is called at
+        most once per host. If it fails the check is run without caching.
+        """
+        if self._cache is None:
+            return self.run(name, host, check, *args, **kwargs)
+        try:
+            digest = self._cache.fingerprint(host, fingerprint)
+        except Exception:
+            return self.run(name, host, check, *args, **kwargs)
+
+        entry = self._cache.lookup(host, name, kwargs, digest)
+        if entry is not None:
+            with self._lock:
+                self._records.append({
+                    'check': name,
+                    'host': host,
+                    'stage': self._stage,
+                    'start': time.time(),
+                    'duration': 0.0,
+                    'attempts': 0,
+                    'cached': True,
+                    'ok': True,
+                    'output': 'passed at stage %s, host unchanged\n' %
+                    entry['stage'],
+                })
+            return True
+
+        result = self.run(name, host, check, *args, **kwargs)
+        if result:
+            self._cache.store(host, name, kwargs, digest, self._stage)
+        else:
+            self._cache.discard(host, name, kwargs)
+        return result
+
+    @property
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def close(self):
+        """ Restore sys.stdout """
+        if isinstance(sys.stdout, _OutputCapture):
+            sys.stdout = self._stdout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write_jsonl(self, fp):
+        for record in self.records:
+            fp.write(json.dumps(record, sort_keys=True) + '\n')
+
+    def write_junit(self, fp):
+        records = self.records
+        suite = ET.Element('testsuite', {
+            'name': 'opencontrail_validate.stage%s' % self._stage,
+            'tests': str(len(records)),
+            'failures': str(len([r for r in records if not r['ok']])),
+            'time': '%.3f' % sum(r['duration'] for r in records),
+        })
+        for record in records:
+            # jenkins splits the classname on '.' into package / class.
+            host = (record['host'] or 'localhost').replace('.', '_')
+            case = ET.SubElement(suite, 'testcase', {
+                'classname': 'stage%s.%s' % (self._stage, host),
+                'name': record['check'],
+                'time': '%.3f' % record['duration'],
+            })
+            if not record['ok']:
+                failure = ET.SubElement(case, 'failure', {
+                    'message': record.get('error', 'check failed')
+                })
+                failure.text = record['output']
+            elif record['output']:
+                ET.SubElement(case, 'system-out').text = record['output']
+        ET.ElementTree(suite).write(fp, encoding='utf-8')
+
+    def write(self, filename, fmt='jsonl'):
+        with open(filename, 'w') as fp:
+            if fmt == 'junit':
+                self.write_junit(fp)
+            else:
+                self.write_jsonl(fp)
@@ -0,0 +1,259 @@
+#!/usr/bin/python
+
+"""
+Rolling upgrade of the vrouter on the nodes of an openshift + opencontrail
+cluster.
+
+The opencontrail playbook is applied to the nodes in batches. After each
+batch, the upgraded nodes must pass a health gate: the vrouter-agent
+container is running and the agent has established its XMPP sessions
+(introspect). The batch window doubles while batches pass the gate and is
+halved when a node fails it. At any time the nodes being upgraded plus the
+nodes that failed the gate stay within --max-unavailable (percentage of the
+nodes); the rollout stops when the failed nodes alone reach that limit.
+"""
+
+import ConfigParser
+import argparse
+import os
+import subprocess
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+import agent_sweep
+from cluster_simulator import ClusterSimulator
+from opencontrail_validate import (
+    contrail_docker_agent, dynamic_inventory, wait_until)
+from sandesh_introspect import ParseError
+from transport import CommandTimeout, ExecutorPool
+
+
+def inventory_hosts(filename, groups):
+    """ (name, address) of the hosts of the inventory groups, in order.
+
+    Expects the inventory to have the following format:
+    [section]
+    hostname ansible_ssh_host=<IP>
+
+    An executable inventory is run as an ansible dynamic inventory script.
+    """
+    if os.path.isfile(filename) and os.access(filename, os.X_OK):
+        inventory = dynamic_inventory(filename)
+        return [host for section in groups
+                for host in inventory.get(section, [])]
+
+    config = ConfigParser.ConfigParser(allow_no_value=True)
+    with open(filename, 'r') as fp:
+        config.readfp(fp)
+
+    hosts = []
+    for section in groups:
+        try:
+            for key, address in config.items(section):
+                hosts.append((key.split()[0], address))
+        except ConfigParser.NoSectionError:
+            pass
+    return hosts
+
+
+def agent_healthy(channel, host, timeout=300):
+    """ Health gate: the vrouter-agent container is running and all the
+    XMPP sessions of the agent are established within timeout.
+    """
+    if not wait_until(lambda: contrail_docker_agent(channel, host),
+                      timeout / 2):
+        return False
+    problems = []
+
+    def agent_ready():
+        try:
+            summary = agent_sweep.agent_summary(channel)
+        except (ParseError, CommandTimeout) as ex:
+            summary = {'error': str(ex)}
+        del problems[:]
+        problems.extend(agent_sweep.agent_failures(summary))
+        return not problems
+
+    if wait_until(agent_ready, timeout / 2):
+        return True
+    print '%s: %s' % (host, ', '.join(problems))
+    return False
+
+
+class RolloutScheduler(object):
+    """ Upgrade hosts in adaptive batches gated by a health check.
+
+    upgrade(batch) applies the upgrade to a list of hosts and returns False
+    when it failed, in which case the whole batch counts as failed;
+    healthy(host) returns True when the host is back in service.
+    max_unavailable is the number of hosts that may be out of service at
+    the same time: hosts in the current batch plus hosts that failed the
+    health gate. The window never exceeds max_unavailable; with the default
+    max_unavailable=1 every batch is a single host.
+    """
+
+    def __init__(self, hosts, upgrade, healthy, max_unavailable=1,
+                 initial_window=1, growth=2, workers=32):
+        self._hosts = list(hosts)
+        self._upgrade = upgrade
+        self._healthy = healthy
+        self._max_unavailable = max(1, max_unavailable)
+        self._growth = growth
+        self._workers = workers
+        self.window = min(max(1, initial_window), self._max_unavailable)
+        self.upgraded = []
+        self.failed = []
+        self.batches = []
+
+    def _gate(self, batch):
+        """ Returns the hosts of the batch that failed the health gate """
+
+        def check(host):
+            try:
+                return host, bool(self._healthy(host))
+            except Exception as ex:
+                print '%s: %s' % (host, ex)
+                return host, False
+
+        if len(batch) <= 1 or self._workers <= 1:
+            results = map(check, batch)
+        else:
+            pool = ThreadPool(min(self._workers, len(batch)))
+            try:
+                results = pool.map(check, batch)
+            finally:
+                pool.close()
+                pool.join()
+        return [host for host, ok in results if not ok]
+
+    def run(self):
+        """ Returns True if all the hosts were upgraded and are healthy. """
+        pending = list(self._hosts)
+        while pending:
+            available = self._max_unavailable - len(self.failed)
+            if available <= 0:
+                print 'Rollout stopped: %d hosts failed the health gate' % (
+                    len(self.failed))
+                break
+            size = min(self.window, available, len(pending))
+            batch, pending = pending[:size], pending[size:]
+
+            start = time.time()
+            if self._upgrade(batch):
+                failed = self._gate(batch)
+            else:
+                failed = list(batch)
+            self.failed.extend(failed)
+            self.upgraded.extend(h for h in batch if h not in failed)
+            self.batches.append((batch, failed, time.time() - start))
+            print 'batch %d: %d hosts, %d failed, %.0fs (%d/%d upgraded)' % (
+                len(self.batches), len(batch), len(failed),
+                time.time() - start, len(self.upgraded), len(self._hosts))
+
+            if failed:
+                self.window = max(1, self.window / 2)
+            else:
+                self.window = min(self.window * self._growth,
+                                  self._max_unavailable)
+        return len(self.upgraded) == len(self._hosts)
+
+
+def ansible_upgrade(inventory, playbook, names, include=None, tags=None):
+    """ upgrade() that runs the playbook limited to the batch. The include
+    groups (e.g. masters) are added to the limit so that their facts are
+    available to the nodes. The upgrade fails when ansible-playbook exits
+    with a non-zero status.
+    """
+
+    def upgrade(batch):
+        limit = list(include or []) + [names[host] for host in batch]
+        cmd = ['ansible-playbook', '-i', inventory, playbook,
+               '--limit', ','.join(limit)]
+        if tags:
+            cmd.extend(['--tags', tags])
+        rc = subprocess.call(cmd)
+        if rc != 0:
+            print 'ansible-playbook exited with status %d' % rc
+            return False
+        return True
+    return upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--playbook', default='playbooks/byo/opencontrail.yml',
+                        help='Playbook applied to each batch')
+    parser.add_argument('--tags', default='opencontrail',
+                        help='Tags of the playbook to run')
+    parser.add_argument('--groups', default='nodes',
+                        help='Inventory groups to upgrade (comma separated)')
+    parser.add_argument('--playbook-inventory',
+                        help='Inventory passed to ansible-playbook (default: '
+                        'the inventory); required with a dynamic inventory, '
+                        'which does not define the group variables')
+    parser.add_argument('--include', default='masters',
+                        help='Groups added to the limit of every batch')
+    parser.add_argument('--max-unavailable', type=float, default=10.0,
+                        help='Percentage of the hosts that may be out of '
+                        'service at the same time')
+    parser.add_argument('--initial-window', type=int, default=1)
+    parser.add_argument('--health-timeout', type=int, default=300,
+                        help='Time for a host to pass the health gate')
+    parser.add_argument('--workers', type=int, default=32,
+                        help='Number of hosts checked concurrently')
+    parser.add_argument('--simulate', type=int, metavar='NODES',
+                        help='Roll out on a simulated cluster of NODES nodes '
+                        '(the upgrade is a no-op)')
+    parser.add_argument('--simulate-faulty', type=int, default=0,
+                        help='Number of simulated nodes that fail the gate')
+    parser.add_argument('inventory', nargs='?')
+
+    args = parser.parse_args()
+
+    if args.simulate:
+        simulator = ClusterSimulator(args.simulate,
+                                     faulty=args.simulate_faulty)
+        groups = simulator.inventory()
+        hosts = [(host, host) for group in args.groups.split(',')
+                 for host in groups.get(group, [])]
+        pool = ExecutorPool(factory=simulator.executor)
+
+        def upgrade(batch):
+            return True
+    elif args.inventory:
+        playbook_inventory = args.playbook_inventory or args.inventory
+        if os.access(playbook_inventory, os.X_OK) and \
+                os.path.isfile(playbook_inventory):
+            parser.error('--playbook-inventory must be a static inventory')
+        hosts = inventory_hosts(args.inventory, args.groups.split(','))
+        pool = ExecutorPool()
+        upgrade = ansible_upgrade(
+            playbook_inventory, args.playbook,
+            dict((address, name) for name, address in hosts),
+            include=[g for g in args.include.split(',') if g],
+            tags=args.tags)
+    else:
+        parser.error('an inventory is required')
+
+    addresses = [address for _, address in hosts]
+    scheduler = RolloutScheduler(
+        addresses, upgrade,
+        lambda host: agent_healthy(pool.get(host), host,
+                                   timeout=args.health_timeout),
+        max_unavailable=int(len(addresses) * args.max_unavailable / 100),
+        initial_window=args.initial_window, workers=args.workers)
+    success = scheduler.run()
+    pool.close()
+
+    print 'Rollout: %d/%d upgraded, %d failed, %d batches' % (
+        len(scheduler.upgraded), len(addresses), len(scheduler.failed),
+        len(scheduler.batches))
+    for host in scheduler.failed:
+        print '  failed: %s' % host
+    if not success:
+        print 'FAIL'
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -71,6 +71,25 @@ def k8s_deploy(deployer) {
     }
 }
 
+// Run the validation script for an install stage and archive the per-check
+// results (JUnit XML) so that check durations can be trended across builds.
+// The report of a failed run is not archived when the caller retries it.
+// The agent sweep only fails the stage when an agent introspect is still
+// unreachable, or its XMPP sessions are not established, after a wait.
+def origin_validate(deployer, stage, archiveFailure = true) {
+    def report = "validate-stage${stage}.xml"
+    def ok = false
+    try {
+        sh "ssh ${ssh_options} centos@${deployer} '(cd src/openshift-ansible; python playbooks/byo/opencontrail_validate.py --stage ${stage} --agent-sweep --cache validate.cache --report ${report} --report-format junit inventory/byo/hosts)'"
+        ok = true
+    } finally {
+        if (ok || archiveFailure) {
+            sh "scp ${ssh_options} centos@${deployer}:src/openshift-ansible/${report} . || true"
+            step([$class: 'JUnitResultArchiver', testResults: report, allowEmptyResults: true])
+        }
+    }
+}
+
 def origin_deploy(deployer) {
     def playbooks = [
         'system-install.yml',
@@ -92,14 +111,14 @@ def origin_deploy(deployer) {
         // version 1.15 of the script-security plugin allows less-than but not greater-than comparissons
         if (0 < i) {
             try {
-                sh "ssh ${ssh_options} centos@${deployer} '(cd src/openshift-ansible; python playbooks/byo/opencontrail_validate.py --stage ${i} inventory/byo/hosts)'"
+                origin_validate(deployer, i, i != 2)
             } catch (AbortException ex) {
                 // openshift config playbook restarts docker and systemd will fail to restart some of the dependent
                 // opencontrail services.
                 if (i == 2) {
                     sh "ssh ${ssh_options} centos@${deployer} '(cd src/openshift-ansible; ansible-playbook -i inventory/byo/hosts playbooks/byo/systemd_workaround.yml)'"
                     steps.sleep(60)
-                    sh "ssh ${ssh_options} centos@${deployer} '(cd src/openshift-ansible; python playbooks/byo/opencontrail_validate.py --stage ${i} inventory/byo/hosts)'"   
+                    origin_validate(deployer, i)
                 } else {
                     throw ex
                 }